@@ -0,0 +1,423 @@
+import argparse
+import contextlib
+import functools
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+from benchmarks import synthetic
+from benchmarks.run import ROOT, percentile
+
+# Load test: N simulated learners using the app at once.
+#
+#     python -m benchmarks.load_test --sessions 16 --rounds 10 --think 0.5
+#     python -m benchmarks.load_test --sessions 32 --processes 4 --size 100000
+#
+# Every session drives app.py and the pages headlessly with Streamlit's
+# AppTest, the way a browser would: open a page, pick an answer, Submit,
+# Next, search, browse the word list, add a word. Between actions it waits
+# an exponentially distributed think time.
+#
+# AppTest installs its runtime process-wide for the length of a rerun, so a
+# process can only rerun one session's script at a time. By default every
+# session therefore gets its own process (--processes defaults to
+# --sessions), which makes the sessions really concurrent, sharing the
+# datasets through the files like separate server processes would. With
+# fewer processes, or --mode threads (all sessions in this process), the
+# sessions of a process queue for it: the report says so, and its
+# throughput is then that of one queue per process, not of a Streamlit
+# server serving its users from threads.
+#
+# Everything runs in a scratch directory holding a copy of datasets/ and
+# db.json (or a seeded synthetic dataset with --size), so the real files are
+# never touched. The report gives throughput, latency percentiles per action
+# (one action is one script rerun), errors with the first message for each
+# action, the file opens and renames in the scratch directory made while the
+# sessions' scripts ran, per file, and the cache hit rates from
+# vocab_core.metrics.
+
+DEFAULT_SESSIONS = 8
+DEFAULT_ROUNDS = 5
+DEFAULT_STEPS = 3
+DEFAULT_THINK = 0.5
+TIMEOUT = 60
+
+PAGES = {
+    "home": "app.py",
+    "words": "pages/1_add_new_word.py",
+    "vocab": "pages/2_vocab_module.py",
+    "spelling": "pages/3_spelling_module.py",
+    "onewords": "pages/4_oneword_substution.py",
+    "idioms": "pages/5_idoms_quiz.py",
+    "progress": "pages/6_progress_stats.py",
+    "performance": "pages/7_performance.py",
+    "search": "pages/8_search.py",
+}
+QUIZ_PAGES = {"vocab", "spelling", "onewords", "idioms"}
+
+RESULTS_FORMAT = 1
+
+# One AppTest rerun at a time per process, see above
+_script_lock = threading.Lock()
+
+
+class FileCounter:
+    # Counts file opens and renames under one directory, per file, made while
+    # a session's script runs (inside scope()). Listens to the interpreter's
+    # audit events instead of replacing open(); an audit hook can't be
+    # removed, so outside scope() it ignores everything.
+
+    def __init__(self, directory):
+        self.directory = os.path.realpath(directory) + os.sep
+        self.counts = Counter()
+        self.lock = threading.Lock()
+        self.active = False
+        sys.addaudithook(self._hook)
+
+    def _count(self, path, kind):
+        try:
+            path = os.path.realpath(os.fspath(path))
+        except TypeError:
+            # File descriptors
+            return
+        if path.startswith(self.directory):
+            with self.lock:
+                self.counts[(path[len(self.directory):], kind)] += 1
+
+    def _hook(self, event, args):
+        if not self.active:
+            return
+        if event == "open":
+            # open() and os.open() both: (path, mode, flags)
+            self._count(args[0], "write" if args[2] & (os.O_WRONLY | os.O_RDWR) else "read")
+        elif event == "os.rename":
+            # os.rename() and os.replace(): (src, dst, ...)
+            self._count(args[1], "replace")
+
+    @contextlib.contextmanager
+    def scope(self):
+        # Reruns are serialized per process, so whatever is opened meanwhile
+        # belongs to the session being rerun (or to background work it set off)
+        self.active = True
+        try:
+            yield
+        finally:
+            self.active = False
+
+
+class Recorder:
+    # Latencies and errors per action, shared by the sessions of a process
+
+    def __init__(self, files):
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        # action -> first error message, so failures can be chased down
+        self.messages = {}
+        self.lock = threading.Lock()
+        self.files = files
+
+    def act(self, at, action, fn):
+        # Runs fn (which reruns the script); True if the script didn't raise
+        started = time.perf_counter()
+        message = None
+        try:
+            with _script_lock, self.files.scope():
+                fn()
+                if at.exception:
+                    message = at.exception[0].message
+        except Exception as e:
+            message = f"{type(e).__name__}: {e}"
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.latencies[action].append(elapsed)
+        if message is not None:
+            self.fail(action, message)
+        return message is None
+
+    def fail(self, action, message):
+        with self.lock:
+            self.errors[action] += 1
+            self.messages.setdefault(action, message)
+
+
+def _labelled(elements, label):
+    return next((e for e in elements if e.label == label), None)
+
+
+def quiz_visit(at, page, act, rng, steps, think):
+    for _ in range(steps):
+        if not at.radio:
+            return
+        radio = at.radio[0]
+        if not act(f"{page}:answer", lambda: radio.set_value(rng.choice(radio.options[1:])).run()):
+            return
+        think()
+        if not act(f"{page}:submit", lambda: _labelled(at.button, "Submit").click().run()):
+            return
+        think()
+        next_button = _labelled(at.button, "Next")
+        if next_button is None or not act(f"{page}:next", lambda: next_button.click().run()):
+            return
+        think()
+
+
+def words_visit(at, page, act, rng, steps, think, queries, session):
+    def menu(choice):
+        # Looked up after every rerun, old elements can't be reused
+        return at.sidebar.radio[0].set_value(choice).run()
+
+    if not act(f"{page}:browse", lambda: menu("View Words")):
+        return
+    think()
+    for _ in range(steps):
+        if not at.number_input:
+            break
+        pages = at.number_input[0]
+        if not act(f"{page}:page", lambda: pages.set_value(rng.randint(1, pages.proto.max)).run()):
+            return
+        think()
+    if not act(f"{page}:open_search", lambda: menu("Search")):
+        return
+    think()
+    if not act(f"{page}:search", lambda: _labelled(at.text_input, "Start typing a word").input(rng.choice(queries)[:5]).run()):
+        return
+    think()
+    if not act(f"{page}:open_add", lambda: menu("Add Word")):
+        return
+    think()
+    word = f"Loadtest{session}x{rng.randrange(10 ** 9)}"
+    _labelled(at.text_input, "Word").input(word)
+    _labelled(at.text_area, "Meaning").input("A word added by the load test")
+    act(f"{page}:save", lambda: _labelled(at.button, "Save Word").click().run())
+
+
+def search_visit(at, page, act, rng, steps, think, queries):
+    for _ in range(steps):
+        query = " ".join(rng.sample(queries, 2))
+        if not act(f"{page}:search", lambda: _labelled(at.text_input, "Search").input(query).run()):
+            return
+        think()
+
+
+def run_session(session, pages, args, recorder, queries):
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(f"{args.seed}/{session}")
+
+    def think():
+        if args.think > 0:
+            time.sleep(rng.expovariate(1 / args.think))
+
+    for round_ in range(args.rounds):
+        # Every session walks the pages in its own order
+        page = pages[(session + round_) % len(pages)]
+        at = AppTest.from_file(os.path.join(ROOT, PAGES[page]), default_timeout=TIMEOUT)
+        # Own progress files per learner
+        at.session_state["user_name"] = f"load{session}"
+        act = functools.partial(recorder.act, at)
+        if not act(f"{page}:open", at.run):
+            continue
+        think()
+        try:
+            if page in QUIZ_PAGES:
+                quiz_visit(at, page, act, rng, args.steps, think)
+            elif page == "words":
+                words_visit(at, page, act, rng, args.steps, think, queries, session)
+            elif page == "search":
+                search_visit(at, page, act, rng, args.steps, think, queries)
+        except Exception as e:
+            # The page didn't show the widget the visit expected
+            recorder.fail(f"{page}:visit", f"{type(e).__name__}: {e}")
+
+
+def run_sessions(sessions, args):
+    # Runs the given sessions as threads in this process, in the working
+    # directory; returns raw latencies, errors, file counts and cache counts
+    from vocab_core import dataset_store, metrics
+
+    # Streamlit warns about running outside `streamlit run` on every rerun
+    logging.disable(logging.WARNING)
+    metrics.set_enabled(True)
+    queries = [entry["word"] for entry in dataset_store.load("vocab")]
+    pages = args.pages.split(",")
+
+    files = FileCounter(os.getcwd())
+    recorder = Recorder(files)
+    threads = [threading.Thread(target=run_session, args=(session, pages, args, recorder, queries))
+               for session in sessions]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    caches = metrics.snapshot()["caches"]
+    return {
+        "latencies": dict(recorder.latencies),
+        "errors": dict(recorder.errors),
+        "messages": recorder.messages,
+        "files": [[path, kind, n] for (path, kind), n in files.counts.items()],
+        "caches": {name: [c["hits"], c["misses"]] for name, c in caches.items()},
+    }
+
+
+def _process_worker(sessions, args):
+    return run_sessions(sessions, args)
+
+
+def sessions_per_process(args):
+    # Sessions that share a process, and so queue for its script runner
+    if args.mode == "threads":
+        return args.sessions
+    return -(-args.sessions // args.processes)
+
+
+def run_load(args):
+    if args.mode == "threads" or args.processes == 1:
+        return [run_sessions(range(args.sessions), args)]
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import get_context
+
+    # spawn: forking a process that runs Streamlit's threads isn't safe
+    groups = [range(args.sessions)[i::args.processes] for i in range(args.processes)]
+    with ProcessPoolExecutor(max_workers=args.processes, mp_context=get_context("spawn")) as pool:
+        return list(pool.map(_process_worker, groups, [args] * len(groups)))
+
+
+def summarize(parts, elapsed):
+    latencies = defaultdict(list)
+    errors = Counter()
+    messages = {}
+    files = Counter()
+    caches = defaultdict(lambda: [0, 0])
+    for part in parts:
+        for action, times in part["latencies"].items():
+            latencies[action] += times
+        errors.update(part["errors"])
+        for action, message in part["messages"].items():
+            messages.setdefault(action, message)
+        for path, kind, n in part["files"]:
+            files[(path, kind)] += n
+        for name, (hits, misses) in part["caches"].items():
+            caches[name][0] += hits
+            caches[name][1] += misses
+
+    actions = {}
+    for action, times in sorted(latencies.items()):
+        ms = sorted(t * 1000 for t in times)
+        actions[action] = {
+            "count": len(ms),
+            "errors": errors[action],
+            "mean_ms": sum(ms) / len(ms),
+            "p50_ms": percentile(ms, 50),
+            "p90_ms": percentile(ms, 90),
+            "p99_ms": percentile(ms, 99),
+            "max_ms": ms[-1],
+        }
+    total = sum(a["count"] for a in actions.values())
+    file_counts = defaultdict(dict)
+    for (path, kind), n in sorted(files.items()):
+        file_counts[path][kind] = n
+    return {
+        "seconds": elapsed,
+        "actions": total,
+        "errors": sum(errors.values()),
+        "actions_per_second": total / elapsed if elapsed else 0,
+        "per_action": actions,
+        "error_messages": dict(sorted(messages.items())),
+        "files": dict(file_counts),
+        "file_operations": {kind: sum(n for (_, k), n in files.items() if k == kind)
+                            for kind in ("read", "write", "replace")},
+        "caches": {name: {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses)}
+                   for name, (hits, misses) in sorted(caches.items()) if hits + misses},
+    }
+
+
+def print_report(report):
+    print(f"{report['actions']} actions in {report['seconds']:.1f}s: "
+          f"{report['actions_per_second']:.1f} actions/s, {report['errors']} errors")
+    if report["sessions_per_process"] > 1:
+        print(f"SERIALIZED: {report['sessions_per_process']} sessions per process took turns rerunning "
+              f"their scripts; the numbers are those of one queue per process")
+    print(f"\n{'action':<24}{'count':>7}{'errors':>7}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for action, a in report["per_action"].items():
+        print(f"{action:<24}{a['count']:>7}{a['errors']:>7}{a['p50_ms']:>10.1f}"
+              f"{a['p90_ms']:>10.1f}{a['p99_ms']:>10.1f}{a['max_ms']:>10.1f}")
+    if report["error_messages"]:
+        print("\nfirst error per action:")
+        for action, message in report["error_messages"].items():
+            print(f"  {action:<24}{message}")
+    ops = report["file_operations"]
+    print(f"\nfile opens during reruns: {ops['read']} read, {ops['write']} write; {ops['replace']} replaces")
+    for path, kinds in sorted(report["files"].items(), key=lambda item: -sum(item[1].values())):
+        print(f"  {path:<40}" + ", ".join(f"{kind} {n}" for kind, n in sorted(kinds.items())))
+    if report["caches"]:
+        print("\ncaches:")
+        for name, c in report["caches"].items():
+            print(f"  {name:<30}{c['hit_rate']:>7.1%} of {c['hits'] + c['misses']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate concurrent learners against a copy of the datasets")
+    parser.add_argument("--sessions", type=int, default=DEFAULT_SESSIONS, help="simulated learners")
+    parser.add_argument("--rounds", type=int, default=DEFAULT_ROUNDS, help="page visits per session")
+    parser.add_argument("--steps", type=int, default=DEFAULT_STEPS,
+                        help="questions answered or searches made per visit")
+    parser.add_argument("--think", type=float, default=DEFAULT_THINK,
+                        help="mean seconds a learner waits between actions")
+    parser.add_argument("--pages", default=",".join(PAGES), help=f"comma-separated, any of {', '.join(PAGES)}")
+    parser.add_argument("--mode", choices=["threads", "processes"], default="processes",
+                        help="threads: every session in this process, taking turns")
+    parser.add_argument("--processes", type=int,
+                        help="with --mode processes (default: one per session)")
+    parser.add_argument("--size", type=int, help="use a synthetic dataset of this many entries")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the report as JSON")
+    args = parser.parse_args(argv)
+    unknown = set(args.pages.split(",")) - set(PAGES)
+    if unknown:
+        parser.error(f"unknown pages: {', '.join(sorted(unknown))}")
+    args.processes = min(args.processes or args.sessions, args.sessions)
+
+    directory = tempfile.mkdtemp(prefix="vocab-load-")
+    cwd = os.getcwd()
+    try:
+        if args.size:
+            synthetic.write(directory, args.size, args.seed)
+        else:
+            shutil.copytree(os.path.join(ROOT, "datasets"), os.path.join(directory, "datasets"),
+                            ignore=shutil.ignore_patterns("*.db", "*.db-wal", "*.db-shm", "*.tmp"))
+        if os.path.exists(os.path.join(ROOT, "db.json")):
+            shutil.copy(os.path.join(ROOT, "db.json"), directory)
+        # JSON storage: the SQLite backend would need a migrated database first
+        os.environ["VOCAB_STORAGE"] = "json"
+        os.chdir(directory)
+        processes = 1 if args.mode == "threads" else args.processes
+        print(f"{args.sessions} sessions in {processes} process(es) in {directory}", file=sys.stderr)
+        started = time.perf_counter()
+        parts = run_load(args)
+        report = summarize(parts, time.perf_counter() - started)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory, ignore_errors=True)
+
+    report["sessions_per_process"] = sessions_per_process(args)
+    report["settings"] = dict(vars(args), output=None)
+    report["python"] = platform.python_version()
+    report["cpus"] = os.cpu_count()
+    report["format"] = RESULTS_FORMAT
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
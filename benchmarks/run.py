@@ -0,0 +1,323 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks import synthetic
+
+# Benchmark suite for the vocab_core operations behind the pages.
+#
+#     python -m benchmarks.run                      # 1k, 10k, 100k and 1M entries
+#     python -m benchmarks.run --sizes 1000,10000 --output new.json --compare old.json
+#
+# For every size a seeded synthetic dataset is written to a scratch directory
+# and a fresh worker process (so caches and memory start cold) times each
+# operation there: latency percentiles over repeated calls, then one extra
+# call under tracemalloc for its peak memory. Two more fresh workers report
+# the resident memory (RSS) added by holding the quiz datasets as dicts (what
+# dataset_store keeps) and in the compact form built from the snapshots (what
+# quiz serving keeps). Results go to a JSON file; --compare flags operations
+# whose p50 or peak memory, or resident memory, grew past --threshold against
+# an earlier results file and exits non-zero.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+DEFAULT_REPEAT = 200
+# Stop repeating an operation after this many seconds (keeping MIN_SAMPLES)
+DEFAULT_BUDGET = 10.0
+MIN_SAMPLES = 3
+BUILD_REPEAT = 5
+DEFAULT_THRESHOLD = 1.25
+
+RESULTS_FORMAT = 1
+RESIDENT_FORMS = ["dicts", "compact"]
+USER = "bench"
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    index = (len(sorted_values) - 1) * p / 100
+    low = int(index)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (index - low)
+
+
+def measure(fn, repeat, budget, setup=None):
+    # fn(arg) where arg = setup() is prepared outside the timing
+    times = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        t = time.perf_counter()
+        fn(arg)
+        times.append(time.perf_counter() - t)
+        if len(times) >= MIN_SAMPLES and time.perf_counter() - started > budget:
+            break
+    arg = setup() if setup else None
+    tracemalloc.start()
+    try:
+        fn(arg)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    times.sort()
+    ms = [t * 1000 for t in times]
+    return {
+        "samples": len(ms),
+        "mean_ms": sum(ms) / len(ms),
+        "p50_ms": percentile(ms, 50),
+        "p90_ms": percentile(ms, 90),
+        "p99_ms": percentile(ms, 99),
+        "max_ms": ms[-1],
+        "peak_memory_bytes": peak,
+    }
+
+
+def _typo(rng, word):
+    i = rng.randrange(len(word))
+    return word[:i] + word[i + 1:]
+
+
+def run_operations(repeat, budget, seed):
+    # Runs in the worker, with the synthetic datasets/ in the working directory
+    from vocab_core import (
+        compact, dataset_store, distractors, global_search, grading, listing, misspellings,
+        questions, search_engine, snapshot, suggest, words,
+    )
+
+    rng = random.Random(seed)
+    results = {}
+
+    def run(name, fn, repeat=repeat, setup=None):
+        results[name] = measure(fn, repeat, budget, setup)
+        print(f"  {name:<26} p50 {results[name]['p50_ms']:10.3f} ms", file=sys.stderr)
+
+    run("load_vocab", lambda _: dataset_store.open_json_dataset("vocab").load(), BUILD_REPEAT)
+    entries = words.load_dataset()
+    keys = [entry["word"] for entry in entries]
+
+    run("find_word", lambda _: words.find_word(rng.choice(keys)))
+
+    run("search_build",
+        lambda _: search_engine.SearchEngine(entries, search_engine.DATASET_FIELDS["vocab"]),
+        BUILD_REPEAT)
+    words.search_words("warm up")
+    run("search", lambda _: words.search_words(_typo(rng, rng.choice(keys).lower())))
+
+    run("bm25_build",
+        lambda _: global_search.InvertedIndex(entries, global_search.DATASET_FIELDS["vocab"]), BUILD_REPEAT)
+    global_search.search("warm up")
+    run("bm25_search", lambda _: global_search.search(" ".join(rng.sample(keys, 2))))
+
+    def loaded_vocab():
+        dataset = dataset_store.open_json_dataset("vocab")
+        dataset.load()
+        return dataset
+
+    run("suggest_build", lambda dataset: suggest.SuggestionIndex(dataset)._rebuild(),
+        BUILD_REPEAT, setup=loaded_vocab)
+    suggest.suggest("vocab", "warm up")
+    run("suggest", lambda _: suggest.suggest("vocab", rng.choice(keys)[:rng.randint(2, 5)]))
+
+    def no_snapshot():
+        if os.path.exists(snapshot.snapshot_path("vocab")):
+            os.remove(snapshot.snapshot_path("vocab"))
+
+    run("snapshot_compile", lambda _: snapshot.compile_snapshot("vocab"), BUILD_REPEAT, setup=no_snapshot)
+    snapshot.get_snapshot("vocab")
+    run("snapshot_open", lambda _: snapshot.Snapshot(snapshot.snapshot_path("vocab")))
+    run("snapshot_entry", lambda _: snapshot.get_snapshot("vocab")[rng.randrange(len(keys))])
+
+    listing.get_listing()
+    run("listing_page", lambda _: listing.get_listing().page(
+        rng.randint(1, max(len(keys) // 25, 1)), 25, rng.choice(listing.SORT_ORDERS)))
+
+    for name in ("vocab", "onewords", "idioms"):
+        data = dataset_store.load(name)
+        run(f"compact_{name}", lambda _, data=data, name=name: compact.Records.for_dataset(name, data),
+            BUILD_REPEAT)
+        records = compact.Records.for_dataset(name, data)
+        run(f"distractor_pools_{name}",
+            lambda _, records=records, name=name: distractors.DistractorPools(
+                records, distractors.DATASET_FIELDS[name], distractors.KEY_FIELDS[name]),
+            BUILD_REPEAT)
+
+    run("collect_words", lambda _: misspellings.collect_words(), BUILD_REPEAT)
+
+    def no_stored_bank():
+        if os.path.exists(misspellings.BANK_PATH):
+            os.remove(misspellings.BANK_PATH)
+
+    run("misspelling_bank_build", lambda _: misspellings.build_bank(), BUILD_REPEAT, setup=no_stored_bank)
+
+    for module in ("vocab", "spelling", "onewords", "idioms"):
+        # First call builds the pools, bank and sampler
+        questions.new_question(module, USER)
+        run(f"question_{module}", lambda _, module=module: questions.new_question(module, USER))
+
+    question = questions.new_question("vocab", USER)
+    run("grade", lambda _: grading.grade(USER, "vocab", question, rng.choice(question["options"]), 1.0))
+
+    # Last: every insert moves the vocab version and invalidates the caches above
+    counter = iter(range(10 ** 9))
+    run("add_word", lambda _: words.add_word(f"Benchword{next(counter)}", "A word added by the benchmark", [], []))
+    return results
+
+
+def resident_bytes():
+    # Current resident set size, or None where /proc isn't available
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def measure_resident(form):
+    # Runs in a fresh worker: resident memory added by holding the quiz
+    # datasets in one form. The snapshots are compiled beforehand, so the
+    # compact run never parses the JSON.
+    from vocab_core import dataset_store, distractors
+
+    gc.collect()
+    before = resident_bytes()
+    if form == "dicts":
+        held = [dataset_store.load(name) for name in distractors.DATASET_FIELDS]
+    else:
+        held = [distractors.get_pools(name) for name in distractors.DATASET_FIELDS]
+    gc.collect()
+    after = resident_bytes()
+    del held
+    return None if before is None else after - before
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_size(size, args):
+    directory = tempfile.mkdtemp(prefix=f"vocab-bench-{size}-")
+    try:
+        started = time.perf_counter()
+        synthetic.write(directory, size, args.seed)
+        generated = time.perf_counter() - started
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+        # JSON storage: the SQLite backend would need a migrated database first
+        env["VOCAB_STORAGE"] = "json"
+        worker = subprocess.run(
+            [sys.executable, "-m", "benchmarks.run", "--worker", "--seed", str(args.seed),
+             "--repeat", str(args.repeat), "--budget", str(args.budget)],
+            cwd=directory, env=env, stdout=subprocess.PIPE, check=True, text=True,
+        )
+        subprocess.run([sys.executable, "-m", "vocab_core.snapshot", "--force"],
+                       cwd=directory, env=env, stdout=subprocess.DEVNULL, check=True)
+        resident = {}
+        for form in RESIDENT_FORMS:
+            worker_rss = subprocess.run(
+                [sys.executable, "-m", "benchmarks.run", "--resident", form],
+                cwd=directory, env=env, stdout=subprocess.PIPE, check=True, text=True,
+            )
+            resident[form] = json.loads(worker_rss.stdout)
+            if resident[form] is not None:
+                print(f"  resident_{form:<17} {resident[form] / 2 ** 20:10.1f} MB", file=sys.stderr)
+        return {"generate_seconds": generated, "operations": json.loads(worker.stdout),
+                "resident_bytes": resident}
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def compare(results, baseline, threshold):
+    # Lines describing regressions of results against baseline
+    regressions = []
+    for size, run in results["sizes"].items():
+        old_run = baseline.get("sizes", {}).get(size)
+        if old_run is None:
+            continue
+        for name, new in run["operations"].items():
+            old = old_run["operations"].get(name)
+            if old is None:
+                continue
+            for metric in ("p50_ms", "peak_memory_bytes"):
+                if old[metric] and new[metric] / old[metric] > threshold:
+                    regressions.append(
+                        f"{size:>8} {name:<26} {metric:<18} {old[metric]:.3f} -> {new[metric]:.3f}"
+                        f" (x{new[metric] / old[metric]:.2f})"
+                    )
+        for form, new in run.get("resident_bytes", {}).items():
+            old = old_run.get("resident_bytes", {}).get(form)
+            if old and new and new / old > threshold:
+                regressions.append(
+                    f"{size:>8} {'resident_' + form:<26} {'bytes':<18} {old} -> {new} (x{new / old:.2f})"
+                )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the English Mastery core on synthetic datasets")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated entry counts per dataset")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="samples per operation")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET,
+                        help="seconds per operation before sampling stops early")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", help="earlier results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="ratio over the baseline that counts as a regression")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--resident", choices=RESIDENT_FORMS, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        json.dump(run_operations(args.repeat, args.budget, args.seed), sys.stdout)
+        return 0
+    if args.resident:
+        json.dump(measure_resident(args.resident), sys.stdout)
+        return 0
+
+    results = {
+        "format": RESULTS_FORMAT,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "seed": args.seed,
+        "sizes": {},
+    }
+    for size in [int(s) for s in args.sizes.split(",")]:
+        print(f"{size} entries", file=sys.stderr)
+        results["sizes"][str(size)] = run_size(size, args)
+        # Written after every size so a long run keeps what it has
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for line in regressions:
+            print("REGRESSION", line)
+        if regressions:
+            return 1
+        print("No regressions against", args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
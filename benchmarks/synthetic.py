@@ -0,0 +1,83 @@
+import json
+import os
+import random
+
+# Seeded synthetic datasets shaped like the real ones in datasets/.
+#
+# Words are made-up but pronounceable (joined syllables), meanings are
+# sentences from a fixed lexicon, synonyms/antonyms are drawn from the word
+# list itself, so lookups, fuzzy matches and distractor pools behave like
+# they would on a big real dictionary. The same size and seed always give
+# the same files.
+
+SYLLABLES = [
+    "ab", "ac", "al", "am", "an", "ar", "be", "bi", "bo", "ca", "ce", "co", "da", "de",
+    "di", "do", "el", "en", "er", "es", "fa", "fi", "fo", "ga", "ge", "gi", "ha", "he",
+    "in", "is", "la", "le", "li", "lo", "lu", "ma", "me", "mi", "mo", "na", "ne", "ni",
+    "no", "or", "pa", "pe", "pi", "po", "ra", "re", "ri", "ro", "sa", "se", "si", "so",
+    "ta", "te", "ti", "to", "tu", "un", "va", "ve", "vi", "zo",
+]
+
+ENDINGS = ["", "", "", "ance", "ent", "ous", "ive", "tion", "ly", "ness", "ate", "ible"]
+
+LEXICON_SIZE = 3000
+
+# Spelling words per entry of the other datasets
+SPELLING_RATIO = 0.1
+
+
+def make_words(rng, n, capitalize=True):
+    # n distinct pseudo-words
+    words = []
+    seen = set()
+    while len(words) < n:
+        word = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) + rng.choice(ENDINGS)
+        if word in seen:
+            continue
+        seen.add(word)
+        words.append(word.capitalize() if capitalize else word)
+    return words
+
+
+def _sentence(rng, lexicon, low, high):
+    text = " ".join(rng.choice(lexicon) for _ in range(rng.randint(low, high)))
+    return text[:1].upper() + text[1:]
+
+
+def generate(size, seed=0):
+    # {dataset name: data} with size entries per dataset
+    rng = random.Random(seed)
+    lexicon = make_words(rng, LEXICON_SIZE, capitalize=False)
+    words = make_words(rng, 2 * size)
+    headwords, others = words[:size], words[size:]
+
+    vocab = []
+    for word in headwords:
+        vocab.append({
+            "word": word,
+            "meaning": _sentence(rng, lexicon, 3, 10),
+            "synonyms": rng.sample(others, rng.randint(0, 8)),
+            "antonyms": rng.sample(others, rng.randint(0, 6)),
+        })
+    onewords = [
+        {"word": word, "meaning": _sentence(rng, lexicon, 4, 12)}
+        for word in rng.sample(others, size)
+    ]
+    idioms = [
+        {"idiom": _sentence(rng, lexicon, 3, 6), "meaning": _sentence(rng, lexicon, 4, 10)}
+        for _ in range(size)
+    ]
+    spelling = rng.sample(headwords, max(1, int(size * SPELLING_RATIO)))
+    return {"vocab": vocab, "onewords": onewords, "idioms": idioms, "spelling": spelling}
+
+
+def write(directory, size, seed=0):
+    # Writes directory/datasets/<name>.json, laid out like the repo's datasets/
+    from vocab_core import dataset_store
+
+    datasets_dir = os.path.join(directory, dataset_store.DATASETS_DIR)
+    os.makedirs(datasets_dir, exist_ok=True)
+    for name, data in generate(size, seed).items():
+        path = os.path.join(datasets_dir, dataset_store.DATASET_FILES[name])
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
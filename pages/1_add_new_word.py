@@ -1,54 +1,9 @@
 import streamlit as st
-import json
-import os
-from rapidfuzz import fuzz
-
-# Dataset path
-DATASET_PATH = "datasets/vocab.json"
-
-# Utility functions
-def load_dataset():
-    if not os.path.exists(DATASET_PATH):
-        return []
-    with open(DATASET_PATH, "r") as f:
-        return json.load(f)
-
-def save_dataset(data):
-    with open(DATASET_PATH, "w") as f:
-        json.dump(data, f, indent=4)
-
-def add_word(word, meaning, synonyms, antonyms):
-    data = load_dataset()
-    existing_words = [entry["word"].lower() for entry in data]
-    if word.lower() in existing_words:
-        return False
-    new_entry = {
-        "word": word,
-        "meaning": meaning,
-        "synonyms": synonyms,
-        "antonyms": antonyms
-    }
-    data.append(new_entry)
-    save_dataset(data)
-    return True
-
-def update_word(index, word, meaning, synonyms, antonyms):
-    data = load_dataset()
-    data[index] = {
-        "word": word,
-        "meaning": meaning,
-        "synonyms": synonyms,
-        "antonyms": antonyms
-    }
-    save_dataset(data)
-
-def delete_word(index):
-    data = load_dataset()
-    del data[index]
-    save_dataset(data)
+from vocab_core import listing, suggest
+from vocab_core.words import DUPLICATE, get_word, add_word, update_word, delete_word, search_words
 
 # Initialize session state
-for key in ["synonyms", "antonyms", "edit_mode", "edit_index", "edit_loaded"]:
+for key in ["synonyms", "antonyms", "edit_mode", "edit_id", "edit_version", "edit_loaded"]:
     if key not in st.session_state:
         if key in ["synonyms", "antonyms"]:
             st.session_state[key] = []
@@ -67,13 +22,20 @@ if menu == "Add Word":
     st.title("➕ Add / Edit Vocabulary Word")
 
     if st.session_state.edit_mode and not st.session_state.edit_loaded:
-        data = load_dataset()
-        entry = data[st.session_state.edit_index]
-        st.session_state.word = entry['word']
-        st.session_state.meaning = entry['meaning']
-        st.session_state.synonyms = entry['synonyms']
-        st.session_state.antonyms = entry['antonyms']
-        st.session_state.edit_loaded = True
+        entry = get_word(st.session_state.edit_id)
+        if entry is None:
+            st.warning("⚠️ This word was deleted by someone else.")
+            st.session_state.edit_mode = None
+            st.session_state.edit_id = None
+        else:
+            st.session_state.word = entry['word']
+            st.session_state.meaning = entry['meaning']
+            # Copy the lists, the dataset is shared with other sessions
+            st.session_state.synonyms = list(entry['synonyms'])
+            st.session_state.antonyms = list(entry['antonyms'])
+            # Remember which version we're editing so stale saves get rejected
+            st.session_state.edit_version = entry['version']
+            st.session_state.edit_loaded = True
 
     word = st.text_input("Word", value=st.session_state.get("word", ""))
     meaning = st.text_area("Meaning", value=st.session_state.get("meaning", ""))
@@ -97,11 +59,16 @@ if menu == "Add Word":
     if st.button("Save Word"):
         if word and meaning:
             if st.session_state.edit_mode:
-                update_word(
-                    st.session_state.edit_index,
+                success = update_word(
+                    st.session_state.edit_id, st.session_state.edit_version,
                     word, meaning, st.session_state.synonyms, st.session_state.antonyms
                 )
-                st.success(f"✅ Word '{word}' updated successfully!")
+                if success == DUPLICATE:
+                    st.warning(f"⚠️ The word '{word}' already exists, your edit was not saved.")
+                elif success:
+                    st.success(f"✅ Word '{word}' updated successfully!")
+                else:
+                    st.error(f"❌ '{word}' was changed or deleted by someone else, your edit was not saved.")
             else:
                 success = add_word(word, meaning, st.session_state.synonyms, st.session_state.antonyms)
                 if success:
@@ -114,30 +81,66 @@ if menu == "Add Word":
             st.session_state.word = ""
             st.session_state.meaning = ""
             st.session_state.edit_mode = None
-            st.session_state.edit_index = None
+            st.session_state.edit_id = None
+            st.session_state.edit_version = None
             st.session_state.edit_loaded = False
         else:
             st.warning("⚠️ Please fill both word and meaning.")
 
-# VIEW WORDS PAGE
+# VIEW WORDS PAGE (paginated, details rendered only for opened words)
 elif menu == "View Words":
     st.title("📖 All Vocabulary Words")
-    data = load_dataset()
-    if data:
-        for i, entry in enumerate(data):
-            st.subheader(f"{i+1}. {entry['word']}")
+
+    if "view_page" not in st.session_state:
+        st.session_state.view_page = 1
+
+    def reset_page():
+        st.session_state.view_page = 1
+
+    def jump_to_letter():
+        letter = st.session_state.view_letter
+        if letter != "—":
+            st.session_state.view_sort = "A → Z"
+            st.session_state.view_page = listing.get_listing().letter_page(
+                letter, st.session_state.view_page_size, st.session_state.get("view_filter", ""))
+            st.session_state.view_letter = "—"
+
+    col1, col2, col3, col4 = st.columns([3, 2, 1, 1])
+    query = col1.text_input("Filter words", key="view_filter", on_change=reset_page)
+    sort = col2.selectbox("Sort by", listing.SORT_ORDERS, key="view_sort", on_change=reset_page)
+    page_size = col3.selectbox("Per page", listing.PAGE_SIZES, key="view_page_size", on_change=reset_page)
+    col4.selectbox("Jump to", ["—"] + [chr(c) for c in range(ord("A"), ord("Z") + 1)],
+                   key="view_letter", on_change=jump_to_letter)
+
+    words = listing.get_listing()
+    total = len(words.view(sort, query))
+    page_count = max(1, -(-total // page_size))
+    st.session_state.view_page = min(st.session_state.view_page, page_count)
+
+    if total:
+        page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, key="view_page")
+        entries, total = words.page(page, page_size, sort, query)
+        first = (page - 1) * page_size
+        st.caption(f"Showing {first + 1}–{first + len(entries)} of {total} words")
+        for n, entry in enumerate(entries, start=first + 1):
+            if not st.toggle(f"{n}. {entry['word']}", key=f"open_{entry['id']}"):
+                continue
             st.write("Meaning:", entry['meaning'])
             st.write("Synonyms:", ", ".join(entry['synonyms']))
             st.write("Antonyms:", ", ".join(entry['antonyms']))
             col1, col2 = st.columns(2)
-            if col1.button("Edit", key=f"edit_{i}"):
+            if col1.button("Edit", key=f"edit_{entry['id']}"):
                 st.session_state.edit_mode = True
-                st.session_state.edit_index = i
+                st.session_state.edit_id = entry['id']
                 st.session_state.edit_loaded = False  # very important!
-                st.experimental_rerun()
-            if col2.button("Delete", key=f"delete_{i}"):
-                delete_word(i)
-                st.experimental_rerun()
+                st.rerun()
+            if col2.button("Delete", key=f"delete_{entry['id']}"):
+                if not delete_word(entry['id'], entry['version']):
+                    st.warning(f"⚠️ '{entry['word']}' was changed by someone else, refresh and try again.")
+                else:
+                    st.rerun()
+    elif query:
+        st.info("No words match this filter.")
     else:
         st.info("No words in the dataset yet.")
 
@@ -145,14 +148,11 @@ elif menu == "View Words":
 elif menu == "Search":
     st.title("🔍 Search Vocabulary")
 
-    data = load_dataset()
-    all_words = [entry['word'] for entry in data]
-
     query = st.text_input("Start typing a word")
 
     selected_word = None
     if query:
-        suggestions = [w for w in all_words if query.lower() in w.lower()]
+        suggestions = suggest.suggest("vocab", query)
         selected_list = st.multiselect("Suggestions (click one):", suggestions)
 
         if selected_list:
@@ -163,20 +163,10 @@ elif menu == "Search":
         selected_word = None
 
     if selected_word:
-        query_lower = selected_word.lower()
-        results = []
-
-        for entry in data:
-            score_word = fuzz.partial_ratio(query_lower, entry['word'].lower())
-            score_meaning = fuzz.partial_ratio(query_lower, entry['meaning'].lower())
-            score_syn = max([fuzz.partial_ratio(query_lower, syn.lower()) for syn in entry['synonyms']] + [0])
-            score_ant = max([fuzz.partial_ratio(query_lower, ant.lower()) for ant in entry['antonyms']] + [0])
-
-            if max(score_word, score_meaning, score_syn, score_ant) >= 60:
-                results.append(entry)
+        results = search_words(selected_word)
 
         if results:
-            st.success(f"Found {len(results)} approximate match(es):")
+            st.success(f"Top {len(results)} approximate match(es):")
             for entry in results:
                 st.subheader(entry['word'])
                 st.write("Meaning:", entry['meaning'])
@@ -1,44 +1,7 @@
 import streamlit as st
-import random
-from utils import load_dataset
-
-# Utility function to create spelling mistakes
-def generate_misspellings(word):
-    mistakes = set()
-
-    if len(word) > 2:
-        i = random.randint(0, len(word)-2)
-        swapped = list(word)
-        swapped[i], swapped[i+1] = swapped[i+1], swapped[i]
-        mistakes.add(''.join(swapped))
-
-    if len(word) > 3:
-        i = random.randint(0, len(word)-1)
-        removed = word[:i] + word[i+1:]
-        mistakes.add(removed)
-
-    i = random.randint(0, len(word))
-    c = random.choice('abcdefghijklmnopqrstuvwxyz')
-    added = word[:i] + c + word[i:]
-    mistakes.add(added)
-
-    i = random.randint(0, len(word)-1)
-    c = random.choice('abcdefghijklmnopqrstuvwxyz')
-    replaced = word[:i] + c + word[i+1:]
-    mistakes.add(replaced)
-
-    mistakes = list(mistakes)
-    random.shuffle(mistakes)
-    return mistakes[:3]
-
-# Build word list from dataset
-def collect_all_words(vocab_list):
-    words = set()
-    for entry in vocab_list:
-        words.add(entry["word"])
-        words.update(entry.get("synonyms", []))
-        words.update(entry.get("antonyms", []))
-    return list(words)
+import time
+import ui
+from vocab_core import grading, metrics, questions
 
 # Initialize session state
 if 'spelling_question' not in st.session_state:
@@ -46,27 +9,26 @@ if 'spelling_question' not in st.session_state:
 if 'spelling_answered' not in st.session_state:
     st.session_state.spelling_answered = False
 
+user = ui.current_user()
+
+if st.session_state.get('spelling_queue_user') != user:
+    st.session_state.spelling_queue = questions.question_queue("spelling", user)
+    st.session_state.spelling_queue_user = user
+
 # Generate new question
 def generate_new_spelling_question():
-    vocab_list = load_dataset()
-    all_words = collect_all_words(vocab_list)
-    correct_word = random.choice(all_words)
-    misspellings = generate_misspellings(correct_word)
-    options = misspellings + [correct_word]
-    random.shuffle(options)
-
-    st.session_state.spelling_question = {
-        'word': correct_word,
-        'options': options
-    }
+    st.session_state.spelling_question = st.session_state.spelling_queue.pop()
     st.session_state.spelling_answered = False
+    st.session_state.spelling_shown_at = time.time()
     # 🔥 No direct reset of radio key here!
 
-# Main spelling practice function
+# Main spelling practice function; only this part reruns on radio, Submit and Next
+@st.fragment
+@metrics.timed("render.spelling", profile=True)
 def spelling_quiz():
     st.header("📝 Spelling Practice (Endless Mode)")
 
-    if st.session_state.spelling_question is None:
+    if st.session_state.spelling_question is None or 'item' not in st.session_state.spelling_question:
         generate_new_spelling_question()
 
     st.write("Select the correctly spelt word:")
@@ -79,14 +41,14 @@ def spelling_quiz():
     if st.button("Submit") and not st.session_state.spelling_answered:
         st.session_state.spelling_answered = True
         correct_word = st.session_state.spelling_question['word']
-        if user_answer == correct_word:
+        if grading.grade(user, "spelling", st.session_state.spelling_question, user_answer,
+                         time.time() - st.session_state.get("spelling_shown_at", time.time())):
             st.success("✅ Correct!")
         else:
             st.error(f"❌ Incorrect. Correct answer: {correct_word}")
 
     if st.session_state.spelling_answered:
-        if st.button("Next"):
-            generate_new_spelling_question()
-            st.rerun()  # 🔄 Force rerun to reset state cleanly
+        # The callback runs before the fragment reruns, so one pass shows the new question
+        st.button("Next", on_click=generate_new_spelling_question)
 
 spelling_quiz()
@@ -0,0 +1,62 @@
+import streamlit as st
+import datetime
+import ui
+from vocab_core import answer_log
+
+user = ui.current_user()
+
+st.title("📈 Progress Stats")
+
+# Everything here comes from the running aggregates, not the raw answer log
+summary = answer_log.summary(user)
+totals = summary["totals"]
+
+if not totals:
+    st.info("No answers recorded yet. Take a quiz and come back!")
+    st.stop()
+
+MODULE_NAMES = {
+    "vocab": "Vocabulary",
+    "spelling": "Spelling",
+    "onewords": "One Word Substitution",
+    "idioms": "Idioms",
+}
+
+# Overall accuracy per module
+modules = [m for m in answer_log.MODULES if m in totals] + sorted(m for m in totals if m not in answer_log.MODULES)
+for column, module in zip(st.columns(len(modules)), modules):
+    counts = totals[module]
+    accuracy = counts["correct"] / counts["total"] * 100
+    column.metric(MODULE_NAMES.get(module, module.title()), f"{accuracy:.0f}%",
+                  f"{counts['correct']} / {counts['total']} correct", delta_color="off")
+    if counts["timed"]:
+        column.caption(f"⏱️ {counts['latency'] / counts['timed']:.1f}s per answer")
+
+# Answers per day over the last two weeks
+st.subheader("Last 14 days")
+today = datetime.date.today()
+days = [(today - datetime.timedelta(days=n)).isoformat() for n in range(13, -1, -1)]
+chart = {}
+for module, per_day in summary["days"].items():
+    chart[MODULE_NAMES.get(module, module.title())] = [per_day.get(day, [0, 0])[1] for day in days]
+if chart:
+    st.bar_chart({"day": days, **chart}, x="day", stack=True)
+
+# Items answered wrong most often
+st.subheader("Needs practice")
+module = st.selectbox("Module", sorted(summary["items"]),
+                      format_func=lambda m: MODULE_NAMES.get(m, m.title()))
+if module:
+    items = summary["items"][module]
+    weakest = sorted(
+        ((item, counts) for item, counts in items.items() if counts[0] < counts[1]),
+        key=lambda pair: (pair[1][0] / pair[1][1], -pair[1][1]),
+    )[:20]
+    if weakest:
+        st.table([
+            {"Item": item, "Correct": correct, "Attempts": total,
+             "Accuracy": f"{correct / total * 100:.0f}%"}
+            for item, (correct, total) in weakest
+        ])
+    else:
+        st.success("No mistakes here yet. 🎉")
@@ -0,0 +1,76 @@
+import streamlit as st
+import datetime
+import os
+from vocab_core import dataset_store, metrics
+
+st.title("⏱️ Performance")
+
+# The switches below are process-wide and any visitor could flip them, so the
+# page is only served when whoever runs the server opts in
+if os.environ.get("VOCAB_PERFORMANCE_PAGE") != "1":
+    st.info("This page is turned off. Start the app with VOCAB_PERFORMANCE_PAGE=1 to use it.")
+    st.stop()
+
+# Instrumentation is process-wide: it covers every session on this server
+on = st.toggle("Collect timings", value=metrics.enabled(),
+               help="Off by default (or set VOCAB_METRICS=1). Spans cost almost nothing while off.")
+if on != metrics.enabled():
+    metrics.set_enabled(on)
+
+col1, col2 = st.columns(2)
+if col1.button("Reset counters"):
+    metrics.reset()
+if col2.button("Profile next quiz fragment rerun",
+               help="The next Submit/Next/answer change on any quiz page runs under cProfile. "
+                    "Only the quiz fragment is profiled, not the rest of the page script."):
+    metrics.request_profile()
+    st.info("Waiting for a quiz interaction... then come back here.")
+
+snapshot = metrics.snapshot()
+
+st.subheader("Operations")
+if snapshot["operations"]:
+    st.dataframe(
+        [
+            {"Operation": name, "Calls": stats["count"],
+             "Mean (ms)": round(stats["mean_ms"], 3), "p50 (ms)": round(stats["p50_ms"], 3),
+             "p95 (ms)": round(stats["p95_ms"], 3), "p99 (ms)": round(stats["p99_ms"], 3),
+             "Max (ms)": round(stats["max_ms"], 3)}
+            for name, stats in snapshot["operations"].items()
+        ],
+        hide_index=True, width="stretch",
+    )
+else:
+    st.caption("Nothing recorded yet." if metrics.enabled() else "Timings are off.")
+
+st.subheader("Caches")
+if snapshot["caches"]:
+    st.dataframe(
+        [
+            {"Cache": name, "Hits": counts["hits"], "Misses": counts["misses"],
+             "Hit rate": f"{counts['hit_rate'] * 100:.1f}%"}
+            for name, counts in snapshot["caches"].items()
+        ],
+        hide_index=True, width="stretch",
+    )
+else:
+    st.caption("Nothing recorded yet." if metrics.enabled() else "Timings are off.")
+
+st.subheader("Datasets")
+rows = []
+for name in dataset_store.DATASET_FILES:
+    path = dataset_store.dataset_path(name)
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    if name in dataset_store.JOURNALED_DATASETS and os.path.exists(dataset_store.journal_path(name)):
+        size += os.path.getsize(dataset_store.journal_path(name))
+    rows.append({"Dataset": name, "Entries": len(dataset_store.load(name)),
+                 "On disk (KB)": round(size / 1024, 1), "Version": dataset_store.version(name)})
+st.dataframe(rows, hide_index=True, width="stretch")
+st.caption(f"Storage backend: {dataset_store.STORAGE}")
+
+profile = metrics.last_profile
+if profile:
+    st.subheader("Last profile")
+    captured = datetime.datetime.fromtimestamp(profile["time"]).strftime("%H:%M:%S")
+    st.caption(f"One rerun of the {profile['name']} quiz fragment at {captured}")
+    st.code(profile["report"], language=None)
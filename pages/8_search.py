@@ -0,0 +1,53 @@
+import streamlit as st
+from vocab_core import global_search
+
+st.title("🔎 Search Everything")
+st.write("Search words, meanings, synonyms and idioms across every dataset, "
+         "e.g. *which idiom means being patient*.")
+
+DATASET_NAMES = {
+    "vocab": "Vocabulary",
+    "onewords": "One Word Substitution",
+    "idioms": "Idioms",
+    "spelling": "Spelling",
+}
+
+query = st.text_input("Search", placeholder="Type a word or describe what you're looking for")
+if not query.strip():
+    st.stop()
+
+LIMITS = [10, 20, 50, 100]
+
+# One search per rerun: facets count every dataset whatever is selected, and
+# the best max(LIMITS) of each dataset covers any selection and limit below
+found = global_search.search(query, limit=max(LIMITS), per_dataset=True)
+facets = found["facets"]
+if not facets:
+    st.warning("Nothing matches. Try other words.")
+    st.stop()
+
+selected = st.pills(
+    "Datasets", list(facets), selection_mode="multi", default=list(facets),
+    format_func=lambda name: f"{DATASET_NAMES[name]} ({facets[name]})",
+)
+limit = st.select_slider("Results", LIMITS, value=20)
+
+results = [result for result in found["results"] if result["dataset"] in selected][:limit]
+if not results:
+    st.info("Pick at least one dataset.")
+
+for result in results:
+    entry = result["entry"]
+    caption = f"{DATASET_NAMES[result['dataset']]} · score {result['score']:.2f}"
+    if result["dataset"] == "spelling":
+        # spelling.json holds bare words
+        st.subheader(entry)
+        st.caption(caption)
+        continue
+    st.subheader(entry.get("idiom") or entry["word"])
+    st.caption(caption)
+    st.write("Meaning:", entry["meaning"])
+    if entry.get("synonyms"):
+        st.write("Synonyms:", ", ".join(entry["synonyms"]))
+    if entry.get("antonyms"):
+        st.write("Antonyms:", ", ".join(entry["antonyms"]))
@@ -0,0 +1,18 @@
+import streamlit as st
+
+# Streamlit helpers shared by the pages
+
+DEFAULT_USER = "guest"
+
+def remember_user():
+    st.session_state.user_name = st.session_state.user_name_input.strip() or DEFAULT_USER
+
+def current_user():
+    # Name typed in the sidebar, kept in a plain session key because widget
+    # state is dropped when switching pages
+    if "user_name" not in st.session_state:
+        st.session_state.user_name = DEFAULT_USER
+    st.session_state.user_name_input = st.session_state.user_name
+    st.sidebar.text_input("Your name", key="user_name_input", on_change=remember_user,
+                          help="Progress and review schedules are kept per name.")
+    return st.session_state.user_name
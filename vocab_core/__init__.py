@@ -0,0 +1,4 @@
+# Dataset storage, question generation, search and grading for the English
+# Mastery app, with no Streamlit dependency. Import the submodules directly
+# (from vocab_core import questions); nothing is loaded eagerly here so that
+# a cold import stays cheap, and numpy/rapidfuzz only load on first search.
@@ -0,0 +1,259 @@
+import atexit
+import copy
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from . import dataset_store, metrics
+
+# Answer events from the quiz pages, and the progress aggregates built from them.
+#
+# Submit only appends an event to an in-memory buffer. A background thread
+# flushes the buffer in batches to an append-only JSON-lines log and folds
+# each batch into in-memory rolling aggregates (totals, per item and per day
+# for every user and module). The log is the persisted delta: a flush only
+# appends to it, under a file lock, after folding in whatever other server
+# processes appended since (so every process's aggregates cover the log). The aggregates are checkpointed next to the log, together
+# with the log offset they cover, once CHECKPOINT_BYTES of log has built up
+# since the last checkpoint (and at exit), so startup replays a bounded log
+# tail. The stats page reads the in-memory aggregates plus the events not
+# flushed yet, never the raw log, and without waiting for disk I/O.
+
+EVENTS_PATH = os.path.join("progress", "answers.jsonl")
+AGGREGATES_PATH = os.path.join("progress", "aggregates.json")
+# Old fixed counters, imported once as LEGACY_USER's totals
+LEGACY_COUNTERS_PATH = "db.json"
+LEGACY_USER = "guest"
+
+AGGREGATES_FORMAT = 1
+
+# Flush at least this often, or sooner once this many events are waiting
+FLUSH_INTERVAL = 2.0
+FLUSH_BATCH = 200
+# Rewrite the aggregates checkpoint after this much new log
+CHECKPOINT_BYTES = 1 << 20
+
+MODULES = ["vocab", "spelling", "onewords", "idioms"]
+
+
+def _empty():
+    return {"format": AGGREGATES_FORMAT, "offset": 0, "totals": {}, "items": {}, "days": {}}
+
+
+def _fold(aggregates, event):
+    user, module = event["user"], event["module"]
+    correct = 1 if event["correct"] else 0
+    totals = aggregates["totals"].setdefault(user, {}).setdefault(
+        module, {"correct": 0, "total": 0, "latency": 0.0, "timed": 0}
+    )
+    totals["correct"] += correct
+    totals["total"] += 1
+    if event.get("latency") is not None:
+        totals["latency"] += event["latency"]
+        totals["timed"] += 1
+    item = aggregates["items"].setdefault(user, {}).setdefault(module, {}).setdefault(
+        event["item"], [0, 0]
+    )
+    item[0] += correct
+    item[1] += 1
+    day = time.strftime("%Y-%m-%d", time.localtime(event["time"]))
+    counts = aggregates["days"].setdefault(user, {}).setdefault(module, {}).setdefault(day, [0, 0])
+    counts[0] += correct
+    counts[1] += 1
+
+
+def _legacy_totals(path):
+    # {"vocab_correct": .., "vocab_total": .., ...} -> per-module totals
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            counters = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    totals = {}
+    for module in {key.rsplit("_", 1)[0] for key in counters}:
+        total = counters.get(module + "_total", 0)
+        if total:
+            totals[module] = {
+                "correct": counters.get(module + "_correct", 0), "total": total,
+                "latency": 0.0, "timed": 0,
+            }
+    return totals
+
+
+class AnswerLog:
+    def __init__(self, events_path=EVENTS_PATH, aggregates_path=AGGREGATES_PATH,
+                 legacy_path=LEGACY_COUNTERS_PATH):
+        self.events_path = events_path
+        self.aggregates_path = aggregates_path
+        self.legacy_path = legacy_path
+        self.buffer = deque()
+        # Events taken from the buffer but not folded into aggregates yet
+        self.pending = []
+        self.aggregates = None
+        self.checkpoint_offset = 0
+        # Held while a batch is written and folded in
+        self.flush_lock = threading.Lock()
+        # Held briefly around changes to buffer/pending/aggregates
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.thread_lock = threading.Lock()
+
+    def record(self, user, module, item, correct, latency=None):
+        # Called on the request path: no I/O here
+        self.buffer.append({
+            "time": time.time(), "user": user, "module": module, "item": item,
+            "correct": bool(correct),
+            "latency": None if latency is None else round(latency, 3),
+        })
+        if len(self.buffer) >= FLUSH_BATCH:
+            self.wakeup.set()
+        self._start()
+
+    def _start(self):
+        if self.thread is not None:
+            return
+        with self.thread_lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="answer-log", daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        while True:
+            self.wakeup.wait(FLUSH_INTERVAL)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except OSError:
+                # Keep the events buffered and try again next round
+                pass
+
+    def _load(self):
+        if self.aggregates is not None:
+            return
+        try:
+            with open(self.aggregates_path, "r", encoding="utf-8") as f:
+                aggregates = json.load(f)
+            if aggregates.get("format") != AGGREGATES_FORMAT:
+                raise ValueError
+        except (FileNotFoundError, ValueError):
+            aggregates = _empty()
+            legacy = _legacy_totals(self.legacy_path)
+            if legacy:
+                aggregates["totals"][LEGACY_USER] = legacy
+        # Events flushed after the aggregates were last written
+        try:
+            with open(self.events_path, "rb") as f:
+                f.seek(aggregates["offset"])
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        # Torn last line from a crash mid-write
+                        break
+                    aggregates["offset"] += len(line)
+                    try:
+                        _fold(aggregates, json.loads(line))
+                    except (ValueError, KeyError):
+                        continue
+        except FileNotFoundError:
+            pass
+        self.checkpoint_offset = aggregates["offset"]
+        self.aggregates = aggregates
+
+    @metrics.timed("answers.flush")
+    def flush(self, checkpoint=False):
+        with self.flush_lock:
+            self._load()
+            with self.lock:
+                while self.buffer:
+                    self.pending.append(self.buffer.popleft())
+                batch = self.pending
+            if batch or self._log_size() != self.aggregates["offset"]:
+                self._append(batch)
+            if checkpoint or self.aggregates["offset"] - self.checkpoint_offset >= CHECKPOINT_BYTES:
+                self._checkpoint()
+
+    def _log_size(self):
+        try:
+            return os.path.getsize(self.events_path)
+        except FileNotFoundError:
+            return 0
+
+    def _append(self, batch):
+        # Under the log's file lock, so other processes' appends are neither
+        # cut off nor interleaved: fold in the lines they wrote since our
+        # offset, drop a torn tail, then append the batch
+        os.makedirs(os.path.dirname(self.events_path) or ".", exist_ok=True)
+        raw = "".join(json.dumps(event) + "\n" for event in batch).encode("utf-8")
+        # On OSError the batch stays in pending for the next flush
+        with dataset_store.file_lock(self.events_path), open(self.events_path, "ab+") as f:
+            size = f.seek(0, os.SEEK_END)
+            # Smaller: the log was removed; the aggregates carry on
+            offset = min(self.aggregates["offset"], size)
+            f.seek(offset)
+            tail = f.read()
+            complete = tail.rfind(b"\n") + 1
+            if complete < len(tail):
+                # No newline at the end while we hold the lock: a crash mid-write
+                f.truncate(offset + complete)
+            if raw:
+                f.write(raw)
+        others = []
+        for line in tail[:complete].splitlines():
+            try:
+                others.append(json.loads(line))
+            except ValueError:
+                continue
+        with self.lock:
+            for event in others + batch:
+                try:
+                    _fold(self.aggregates, event)
+                except KeyError:
+                    continue
+            self.aggregates["offset"] = offset + complete + len(raw)
+            self.pending = []
+
+    def _checkpoint(self):
+        if self.aggregates["offset"] == self.checkpoint_offset:
+            return
+        with self.lock:
+            raw = json.dumps(self.aggregates).encode("utf-8")
+            offset = self.aggregates["offset"]
+        dataset_store.write_atomic(self.aggregates_path, raw)
+        self.checkpoint_offset = offset
+
+    def close(self):
+        self.flush(checkpoint=True)
+
+    def summary(self, user):
+        # Aggregates of one user, including events not flushed yet
+        if self.aggregates is None:
+            with self.flush_lock:
+                self._load()
+        with self.lock:
+            summary = {
+                part: {user: copy.deepcopy(self.aggregates[part].get(user, {}))}
+                for part in ("totals", "items", "days")
+            }
+            unfolded = self.pending + list(self.buffer)
+        for event in unfolded:
+            if event["user"] == user:
+                _fold(summary, event)
+        return {part: summary[part][user] for part in ("totals", "items", "days")}
+
+
+_log = AnswerLog()
+atexit.register(_log.close)
+
+
+def record(user, module, item, correct, latency=None):
+    _log.record(user, module, item, correct, latency)
+
+
+def flush():
+    _log.flush()
+
+
+def summary(user):
+    return _log.summary(user)
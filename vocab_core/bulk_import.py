@@ -0,0 +1,230 @@
+import argparse
+import csv
+import json
+import re
+import sys
+import time
+
+from . import dataset_store
+
+# Bulk import of words, one-word substitutions or idioms from CSV or JSONL.
+#
+#     python -m vocab_core.bulk_import vocab words.csv --rejects rejects.jsonl
+#
+# Rows are streamed, validated and normalized (trimmed, whitespace collapsed,
+# list fields deduplicated), then checked case-insensitively against a hash
+# map of the existing keys. A word that already exists gets the new synonyms
+# and antonyms merged into it; other duplicates are skipped. Accepted rows are
+# committed in batches through dataset_store.apply_batch, which is a single
+# snapshot write (JSON) or transaction (SQLite) per batch, so a 50k-row file
+# costs a few dozen writes instead of one rewrite per word.
+#
+# CSV files need a header naming the columns; list columns (synonyms,
+# antonyms) hold values separated by ";" or "|". JSONL rows are objects whose
+# list fields are arrays or such strings.
+
+SPECS = {
+    "vocab": {"key": "word", "fields": ["word", "meaning"], "lists": ["synonyms", "antonyms"]},
+    "onewords": {"key": "word", "fields": ["word", "meaning"], "lists": []},
+    "idioms": {"key": "idiom", "fields": ["idiom", "meaning"], "lists": []},
+}
+
+DEFAULT_BATCH_SIZE = 5000
+MAX_KEY_LENGTH = 200
+MAX_TEXT_LENGTH = 2000
+
+LIST_SEPARATORS = re.compile(r"[;|]")
+WHITESPACE = re.compile(r"\s+")
+
+
+def read_rows(path, fmt):
+    # Yields (line number, row dict or None for an unparseable line)
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if fmt == "csv":
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    yield line_number, None
+                    continue
+                yield line_number, row if isinstance(row, dict) else None
+
+
+def _clean(value):
+    return WHITESPACE.sub(" ", str(value)).strip()
+
+
+def _merge_lists(*lists):
+    # Case-insensitive union, first spelling and order kept
+    merged = []
+    seen = set()
+    for values in lists:
+        for value in values:
+            if value.lower() not in seen:
+                seen.add(value.lower())
+                merged.append(value)
+    return merged
+
+
+def normalize(spec, row):
+    # Returns (entry, None) or (None, reason)
+    entry = {}
+    for field in spec["fields"]:
+        value = _clean(row.get(field) or "")
+        if not value:
+            return None, f"missing {field}"
+        limit = MAX_KEY_LENGTH if field == spec["key"] else MAX_TEXT_LENGTH
+        if len(value) > limit:
+            return None, f"{field} longer than {limit} characters"
+        entry[field] = value
+    key = entry[spec["key"]].lower()
+    for field in spec["lists"]:
+        values = row.get(field) or []
+        if isinstance(values, str):
+            values = LIST_SEPARATORS.split(values)
+        elif not isinstance(values, list):
+            return None, f"{field} is not a list"
+        values = [_clean(value) for value in values]
+        entry[field] = _merge_lists([v for v in values if v and v.lower() != key])
+    return entry, None
+
+
+class Importer:
+    def __init__(self, name, batch_size=DEFAULT_BATCH_SIZE, dry_run=False, rejects=None):
+        self.name = name
+        self.spec = SPECS[name]
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.rejects = rejects
+        # Lowercased key -> stored entry: the dedup hash map
+        self.existing = {
+            entry[self.spec["key"]].lower(): entry for entry in dataset_store.load(name)
+        }
+        # Lowercased key -> op waiting in the current batch
+        self.pending = {}
+        self.counts = {"read": 0, "added": 0, "merged": 0, "duplicates": 0, "rejected": 0}
+        self.reasons = {}
+        self.batches = 0
+
+    def reject(self, line_number, reason, row):
+        self.counts["rejected"] += 1
+        self.reasons[reason] = self.reasons.get(reason, 0) + 1
+        if self.rejects is not None:
+            self.rejects.write(json.dumps({"line": line_number, "reason": reason, "row": row}) + "\n")
+
+    def add(self, line_number, row):
+        self.counts["read"] += 1
+        if row is None:
+            self.reject(line_number, "unparseable row", None)
+            return
+        entry, reason = normalize(self.spec, row)
+        if entry is None:
+            self.reject(line_number, reason, row)
+            return
+        key = entry[self.spec["key"]].lower()
+        op = self.pending.get(key)
+        if op is not None:
+            # Same key earlier in this batch: fold the lists into that op
+            if not self._merge_into(op["entry"], entry):
+                self.counts["duplicates"] += 1
+            return
+        current = self.existing.get(key)
+        if current is None:
+            self.pending[key] = {"op": "add", "entry": entry, "line": line_number}
+        elif "id" in current and self.spec["lists"]:
+            merged = dict(current)
+            if not self._merge_into(merged, entry):
+                self.counts["duplicates"] += 1
+                return
+            self.pending[key] = {
+                "op": "update", "id": current["id"], "version": current["version"],
+                "entry": {field: merged[field] for field in self.spec["fields"] + self.spec["lists"]},
+                "line": line_number,
+            }
+        else:
+            self.counts["duplicates"] += 1
+            return
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def _merge_into(self, target, entry):
+        # Adds entry's list values to target; False if there was nothing new
+        changed = False
+        for field in self.spec["lists"]:
+            merged = _merge_lists(target.get(field, []), entry[field])
+            if len(merged) != len(target.get(field, [])):
+                target[field] = merged
+                changed = True
+        return changed
+
+    def flush(self):
+        if not self.pending:
+            return
+        ops = list(self.pending.values())
+        self.pending = {}
+        if self.dry_run:
+            results = [dict(op["entry"], id=op.get("id", "dry-run"), version=op.get("version", 0)) for op in ops]
+        else:
+            results = dataset_store.apply_batch(
+                self.name, [{k: v for k, v in op.items() if k != "line"} for op in ops]
+            )
+        self.batches += 1
+        for op, stored in zip(ops, results):
+            if stored is None:
+                # The word was added, edited or deleted since we read it, by
+                # this or another process: apply_batch replays other writers'
+                # journal lines under the dataset's write lock before checking
+                self.reject(op["line"], "changed concurrently", op["entry"])
+                continue
+            self.counts["added" if op["op"] == "add" else "merged"] += 1
+            self.existing[stored[self.spec["key"]].lower()] = stored
+
+
+def run(name, path, fmt=None, batch_size=DEFAULT_BATCH_SIZE, dry_run=False, rejects_path=None):
+    # Returns the report dict
+    fmt = fmt or ("csv" if path.lower().endswith(".csv") else "jsonl")
+    started = time.perf_counter()
+    rejects = open(rejects_path, "w", encoding="utf-8") if rejects_path else None
+    try:
+        importer = Importer(name, batch_size, dry_run, rejects)
+        for line_number, row in read_rows(path, fmt):
+            importer.add(line_number, row)
+        importer.flush()
+    finally:
+        if rejects is not None:
+            rejects.close()
+    elapsed = time.perf_counter() - started
+    return dict(
+        importer.counts, batches=importer.batches, reasons=importer.reasons,
+        seconds=round(elapsed, 3), rows_per_second=round(importer.counts["read"] / elapsed if elapsed else 0),
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import rows into an English Mastery dataset")
+    parser.add_argument("dataset", choices=sorted(SPECS))
+    parser.add_argument("file", help="CSV (with a header row) or JSON-lines file")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="default: from the file extension")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--rejects", help="write rejected rows here, one JSON object per line")
+    parser.add_argument("--dry-run", action="store_true", help="validate and count without saving")
+    args = parser.parse_args(argv)
+
+    report = run(args.dataset, args.file, args.format, args.batch_size, args.dry_run, args.rejects)
+    print(f"{report['read']} rows in {report['seconds']}s ({report['rows_per_second']} rows/s), "
+          f"{report['batches']} batches{' (dry run)' if args.dry_run else ''}")
+    print(f"  added {report['added']}, merged {report['merged']}, "
+          f"duplicates {report['duplicates']}, rejected {report['rejected']}")
+    for reason, count in sorted(report["reasons"].items(), key=lambda item: -item[1]):
+        print(f"    {count:>7}  {reason}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+from array import array
+
+# Compact, interned in-memory form of a dataset for the read-side indexes.
+#
+# As dicts, every entry costs a dict, a list per list field and a str object
+# per value, and synonyms repeat heavily across entries. Records keeps each
+# distinct string once, packed into the UTF-8 heap of a StringTable, and
+# refers to it by int id: scalar fields are parallel arrays of ids, one slot
+# per entry, and list fields are CSR pairs (an offsets array with n + 1 slots
+# and one flat values array), so entry i's synonyms are
+# values[offsets[i]:offsets[i + 1]]. Every id also maps to the id of its
+# lowercased string, which makes case-insensitive checks such as "is this one
+# of the word's synonyms?" integer set lookups.
+#
+# This doesn't replace the dicts dataset_store keeps. With the JSON backend
+# the quiz pools are built from the compiled snapshot (snapshot.py), so a
+# process that only serves quizzes never holds the dict form; one that also
+# serves search or editing holds both. benchmarks/run.py reports the resident
+# memory of each form.
+
+# Dataset name -> (scalar fields, list fields) kept in the compact form
+SCHEMAS = {
+    "vocab": (("word", "meaning"), ("synonyms", "antonyms")),
+    "onewords": (("word", "meaning"), ()),
+    "idioms": (("idiom", "meaning"), ()),
+}
+
+
+class StringTable:
+    # Interns strings while a dataset is read in; freeze() then packs them
+    # into one UTF-8 heap with an offsets array and drops the lookup dict
+    def __init__(self):
+        self.strings = []
+        self.ids = {}
+        # id -> id of the lowercased string (itself when already lowercase)
+        self.folded = array("i")
+        self.heap = b""
+        self.offsets = array("q", [0])
+
+    def __len__(self):
+        return len(self.folded)
+
+    def __getitem__(self, string_id):
+        if self.strings is not None:
+            return self.strings[string_id]
+        return self.heap[self.offsets[string_id]:self.offsets[string_id + 1]].decode("utf-8")
+
+    def intern(self, value):
+        string_id = self.ids.get(value)
+        if string_id is not None:
+            return string_id
+        string_id = len(self.strings)
+        self.ids[value] = string_id
+        self.strings.append(value)
+        self.folded.append(string_id)
+        lower = value.lower()
+        if lower != value:
+            self.folded[string_id] = self.intern(lower)
+        return string_id
+
+    def freeze(self):
+        encoded = [value.encode("utf-8") for value in self.strings]
+        position = 0
+        for value in encoded:
+            position += len(value)
+            self.offsets.append(position)
+        self.heap = b"".join(encoded)
+        self.strings = None
+        self.ids = None
+
+
+class Records:
+    def __init__(self, entries, fields, lists=()):
+        # entries: any iterable of dicts, read once (a snapshot decodes each
+        # entry as it's reached)
+        self.table = StringTable()
+        intern = self.table.intern
+        self.fields = {field: array("i") for field in fields}
+        # field -> (offsets, values)
+        self.lists = {field: (array("i", [0]), array("i")) for field in lists}
+        self.size = 0
+        for entry in entries:
+            for field, ids in self.fields.items():
+                ids.append(intern(entry.get(field, "")))
+            for field, (offsets, values) in self.lists.items():
+                values.extend([intern(value) for value in entry.get(field) or ()])
+                offsets.append(len(values))
+            self.size += 1
+        self.table.freeze()
+
+    @classmethod
+    def for_dataset(cls, name, entries):
+        fields, lists = SCHEMAS[name]
+        return cls(entries, fields, lists)
+
+    def __len__(self):
+        return self.size
+
+    def get(self, field, i):
+        return self.table[self.fields[field][i]]
+
+    def ids(self, field, i):
+        # String ids of entry i's value(s) for a scalar or list field
+        if field in self.fields:
+            return (self.fields[field][i],)
+        offsets, values = self.lists[field]
+        return values[offsets[i]:offsets[i + 1]]
+
+    def folded_set(self, i, *fields):
+        # Lowercased string ids of entry i's values for the given fields
+        folded = self.table.folded
+        return {folded[string_id] for field in fields for string_id in self.ids(field, i)}
+
+    def entry(self, i):
+        # Entry i as the usual dict
+        table = self.table
+        entry = {field: table[ids[i]] for field, ids in self.fields.items()}
+        for field, (offsets, values) in self.lists.items():
+            entry[field] = [table[string_id] for string_id in values[offsets[i]:offsets[i + 1]]]
+        return entry
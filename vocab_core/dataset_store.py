@@ -0,0 +1,572 @@
+import contextlib
+import hashlib
+import json
+import os
+import threading
+import uuid
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: writes are then only serialized within the process
+    fcntl = None
+
+from . import metrics
+
+# Process-wide, in-memory cache of the JSON datasets.
+#
+# Every Streamlit session runs in the same process, so each dataset is parsed
+# once and shared by all readers. Before handing data out we stat the file and
+# reload only if its mtime or size changed, which also picks up hand edits and
+# writes made by other processes.
+#
+# Data returned by load() is shared between sessions: treat it as read-only and
+# go through save()/insert()/update()/delete() (or the helpers in words.py)
+# to change it.
+#
+# Writers also take an exclusive lock on <file>.lock and reload whatever other
+# processes wrote before changing anything, so the app and the command line
+# tools (bulk_import, dedup) can write to the same dataset without losing
+# each other's edits.
+
+DATASETS_DIR = "datasets"
+
+DATASET_FILES = {
+    "vocab": "vocab.json",
+    "onewords": "onewords.json",
+    "idioms": "idioms.json",
+    "spelling": "spelling.json",
+}
+
+# Datasets edited from the app get an append-only journal next to the snapshot
+JOURNALED_DATASETS = {"vocab"}
+
+# Fold the journal back into the snapshot once it holds this many edits
+JOURNAL_COMPACT_THRESHOLD = 500
+
+# update() result when the new key belongs to a different entry
+DUPLICATE = "duplicate"
+
+# "json" (default) or "sqlite", see sqlite_store.py
+STORAGE = os.environ.get("VOCAB_STORAGE", "json")
+
+
+def dataset_path(name):
+    return os.path.join(DATASETS_DIR, DATASET_FILES[name])
+
+
+def journal_path(name):
+    return os.path.splitext(dataset_path(name))[0] + ".journal.jsonl"
+
+
+def _file_stamp(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _digest(raw):
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+def write_atomic(path, raw):
+    # Write to a temp file and rename so readers never see half a file. The
+    # temp name is per process and thread, so concurrent writers never write
+    # into or rename each other's temp file; the last rename wins.
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(raw)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    # Exclusive lock on path + ".lock" against other processes (and other
+    # open()s in this one); only serializes within the process without fcntl
+    if fcntl is None:
+        yield
+        return
+    with open(path + ".lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def read_journal(path, offset=0):
+    # (records of the complete journal lines from byte offset on, offset just
+    # past the last of them); FileNotFoundError if there is no journal
+    with open(path, "rb") as f:
+        f.seek(offset)
+        tail = f.read()
+    records = []
+    for line in tail.splitlines(keepends=True):
+        # A line without newline is a torn write (or one still in flight)
+        if not line.endswith(b"\n"):
+            break
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            break
+        offset += len(line)
+    return records, offset
+
+
+def _dump(data):
+    return json.dumps(data, indent=4).encode("utf-8")
+
+
+class Dataset:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self.stamp = None
+        self.data = None
+        self.version = 0
+        self.listeners = []
+        self.writers = 0
+
+    def subscribe(self, listener):
+        # listener(kind, old_entry, new_entry) is called under the dataset
+        # lock for every single-entry edit ("add", "update", "delete") and
+        # with kind "reset" whenever the whole list is replaced
+        self.listeners.append(listener)
+
+    def _notify(self, kind, old=None, new=None):
+        for listener in self.listeners:
+            listener(kind, old, new)
+
+    def _current_stamp(self):
+        return _file_stamp(self.path)
+
+    @contextlib.contextmanager
+    def writing(self):
+        # Exclusive against other threads and other processes; reentrant
+        with self.lock, contextlib.ExitStack() as stack:
+            if not self.writers:
+                stack.enter_context(file_lock(self.path))
+            self.writers += 1
+            try:
+                yield
+            finally:
+                self.writers -= 1
+
+    @metrics.timed("dataset.reload")
+    def _reload(self):
+        if not os.path.exists(self.path):
+            self.data = []
+        else:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.data = json.load(f)
+
+    def load(self):
+        # Fast path: a single stat() when nothing changed on disk
+        stamp = self._current_stamp()
+        if self.data is not None and stamp == self.stamp:
+            metrics.cache("dataset.load", True)
+            return self.data
+        with self.lock:
+            stamp = self._current_stamp()
+            if self.data is None or stamp != self.stamp:
+                metrics.cache("dataset.load", False)
+                self._reload()
+                self.stamp = self._current_stamp()
+                self.version += 1
+                self._notify("reset")
+            return self.data
+
+    @metrics.timed("dataset.save")
+    def save(self, data):
+        with self.writing():
+            write_atomic(self.path, _dump(data))
+            self.data = data
+            self.stamp = self._current_stamp()
+            self.version += 1
+            self._notify("reset")
+
+    def apply_batch(self, ops):
+        # Plain datasets have no ids, so only "add" ops; one atomic rewrite
+        with self.writing():
+            data = list(self.load())
+            entries = [dict(op["entry"]) for op in ops]
+            data.extend(entries)
+            self.save(data)
+            return entries
+
+
+class IndexedDataset(Dataset):
+    # In-memory list plus id -> position and lowercased key -> id indexes,
+    # shared by the backends that support single-entry edits.
+
+    def __init__(self, path, key="word"):
+        super().__init__(path)
+        self.key = key
+        self.positions = {}
+        self.keys = {}
+
+    def _index(self):
+        # Entries from before ids existed get one derived from their position
+        # and word. That is stable for as long as this snapshot is, and the
+        # journal is only ever replayed against the snapshot it was written
+        # for; the next compaction persists the ids.
+        for i, entry in enumerate(self.data):
+            if "id" not in entry:
+                entry["id"] = uuid.uuid5(uuid.NAMESPACE_OID, f"{i}:{entry.get(self.key)}").hex
+            entry.setdefault("version", 1)
+        self.positions = {entry["id"]: i for i, entry in enumerate(self.data)}
+        self.keys = {entry[self.key].lower(): entry["id"] for entry in self.data}
+        self._notify("reset")
+
+    def _apply(self, op):
+        kind = op["op"]
+        if kind == "add":
+            entry = op["entry"]
+            self.positions[entry["id"]] = len(self.data)
+            self.keys[entry[self.key].lower()] = entry["id"]
+            self.data.append(entry)
+            self._notify("add", None, entry)
+        elif kind == "update":
+            # Entries are replaced whole, never mutated in place
+            index = self.positions[op["id"]]
+            old = self.data[index]
+            self._drop_key(old)
+            self.data[index] = op["entry"]
+            self.keys[op["entry"][self.key].lower()] = op["id"]
+            self._notify("update", old, op["entry"])
+        elif kind == "delete":
+            # Copy-on-write so sessions iterating the old list are unaffected
+            index = self.positions.pop(op["id"])
+            old = self.data[index]
+            self._drop_key(old)
+            self.data = self.data[:index] + self.data[index + 1:]
+            for i in range(index, len(self.data)):
+                self.positions[self.data[i]["id"]] = i
+            self._notify("delete", old, None)
+
+    def get(self, entry_id):
+        data = self.load()
+        index = self.positions.get(entry_id)
+        if index is not None and index < len(data) and data[index]["id"] == entry_id:
+            return data[index]
+        # positions may already describe a newer list than the one we got
+        return next((entry for entry in data if entry["id"] == entry_id), None)
+
+    def _batch(self, ops):
+        # Applies {"op": "add", "entry"} and {"op": "update", "id", "version",
+        # "entry"} ops in memory with the usual duplicate and version checks.
+        # Returns the stored entry for each op, None where it was rejected.
+        results = []
+        for op in ops:
+            if op["op"] == "add":
+                if op["entry"][self.key].lower() in self.keys:
+                    results.append(None)
+                    continue
+                entry = dict(op["entry"], id=uuid.uuid4().hex, version=1)
+                self._apply({"op": "add", "entry": entry})
+            else:
+                current = self.get(op["id"])
+                if (current is None or current["version"] != op["version"]
+                        or self._taken(op["entry"], op["id"])):
+                    results.append(None)
+                    continue
+                entry = dict(op["entry"], id=op["id"], version=op["version"] + 1)
+                self._apply({"op": "update", "id": op["id"], "entry": entry})
+            results.append(entry)
+        return results
+
+    def _taken(self, entry, entry_id):
+        # Whether entry's key already belongs to another entry
+        owner = self.keys.get(entry[self.key].lower())
+        return owner is not None and owner != entry_id
+
+    def _drop_key(self, entry):
+        key = entry[self.key].lower()
+        if self.keys.get(key) == entry["id"]:
+            del self.keys[key]
+
+    def find(self, key):
+        # Case-insensitive lookup on the key field ("word", "idiom")
+        self.load()
+        entry_id = self.keys.get(key.lower())
+        return None if entry_id is None else self.get(entry_id)
+
+
+class JournaledDataset(IndexedDataset):
+    # Snapshot (the plain JSON array) plus a JSON-lines journal of edits made
+    # since the snapshot was written. An edit is one appended line, so it costs
+    # the same whatever the size of the dataset; load() replays the journal on
+    # top of the snapshot.
+    #
+    # The first journal line records a digest of the snapshot it applies to.
+    # Compaction writes the new snapshot and a fresh journal with atomic
+    # renames; if we crash between the two, the leftover journal no longer
+    # matches the snapshot and is ignored, which is correct because the new
+    # snapshot already contains every edit in it. The same happens if the
+    # snapshot is replaced by hand.
+    #
+    # Every entry carries a stable "id" and a "version" counter. Updates and
+    # deletes name the version they were based on and are rejected if the
+    # entry has moved on since (compare-and-swap), so concurrent editors can't
+    # silently overwrite each other. The check and the journal append happen
+    # in one short critical section; readers never take the lock.
+    #
+    # That critical section holds the file lock (see writing()) and starts by
+    # replaying journal lines other processes appended, so the checks see
+    # their edits too and a snapshot rewrite can't drop them.
+
+    def __init__(self, path, journal):
+        super().__init__(path)
+        self.journal = journal
+        self.base = None
+        self.journal_base = None
+        self.journal_offset = 0
+        self.journal_ops = 0
+        self.compacting = False
+
+    def _current_stamp(self):
+        return (_file_stamp(self.path), _file_stamp(self.journal))
+
+    @metrics.timed("dataset.reload")
+    def _reload(self):
+        raw = b""
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                raw = f.read()
+        self.data = json.loads(raw) if raw.strip() else []
+        self.base = _digest(raw)
+        self._index()
+        self.journal_base = None
+        self.journal_offset = 0
+        self.journal_ops = 0
+        self._replay()
+
+    def _replay(self):
+        try:
+            records, self.journal_offset = read_journal(self.journal, self.journal_offset)
+        except FileNotFoundError:
+            return
+        for record in records:
+            if "base" in record:
+                self.journal_base = record["base"]
+            elif self.journal_base == self.base:
+                self._apply(record)
+                self.journal_ops += 1
+
+    def load(self):
+        stamp = self._current_stamp()
+        if self.data is not None and stamp == self.stamp:
+            metrics.cache("dataset.load", True)
+            return self.data
+        with self.lock:
+            stamp = self._current_stamp()
+            if stamp != self.stamp or self.data is None:
+                metrics.cache("dataset.load", False)
+            if self.data is None or stamp[0] != self.stamp[0]:
+                self._reload()
+                self.version += 1
+            elif stamp != self.stamp:
+                # Only the journal grew: replay just the new lines
+                self._replay()
+                self.version += 1
+            self.stamp = self._current_stamp()
+            return self.data
+
+    def insert(self, entry):
+        with self.writing():
+            if self.find(entry[self.key]) is not None:
+                return None
+            entry = dict(entry, id=uuid.uuid4().hex, version=1)
+            self.append({"op": "add", "entry": entry})
+            return entry
+
+    def update(self, entry_id, expected_version, entry):
+        with self.writing():
+            current = self.get(entry_id)
+            if current is None or current["version"] != expected_version:
+                return None
+            if self._taken(entry, entry_id):
+                return DUPLICATE
+            entry = dict(entry, id=entry_id, version=expected_version + 1)
+            self.append({"op": "update", "id": entry_id, "entry": entry})
+            return entry
+
+    def delete(self, entry_id, expected_version):
+        with self.writing():
+            current = self.get(entry_id)
+            if current is None or current["version"] != expected_version:
+                return False
+            self.append({"op": "delete", "id": entry_id})
+            return True
+
+    @metrics.timed("dataset.append")
+    def append(self, op):
+        with self.writing():
+            self.load()
+            size = _file_stamp(self.journal)
+            if self.journal_base != self.base or size is None:
+                # No journal yet, or it belongs to an older snapshot
+                header = json.dumps({"base": self.base}) + "\n"
+                write_atomic(self.journal, header.encode("utf-8"))
+                self.journal_base = self.base
+                self.journal_offset = len(header)
+                self.journal_ops = 0
+            elif size[1] != self.journal_offset:
+                # Drop a torn line left behind by a crash
+                os.truncate(self.journal, self.journal_offset)
+            line = (json.dumps(op) + "\n").encode("utf-8")
+            with open(self.journal, "ab") as f:
+                f.write(line)
+            self.journal_offset += len(line)
+            self.journal_ops += 1
+            self._apply(op)
+            self.stamp = self._current_stamp()
+            self.version += 1
+            if self.journal_ops >= JOURNAL_COMPACT_THRESHOLD and not self.compacting:
+                self.compacting = True
+                threading.Thread(target=self.compact, daemon=True).start()
+
+    @metrics.timed("dataset.batch")
+    def apply_batch(self, ops):
+        # Many edits, persisted with one new snapshot (a single atomic rename)
+        # instead of a journal line each
+        with self.writing():
+            self.load()
+            results = self._batch(ops)
+            self._write_snapshot(self.data)
+            self.version += 1
+            return results
+
+    def compact(self):
+        with self.writing():
+            try:
+                self.load()
+                self._write_snapshot(self.data)
+            finally:
+                self.compacting = False
+
+    @metrics.timed("dataset.save")
+    def save(self, data):
+        with self.writing():
+            self.data = data
+            self._index()
+            self._write_snapshot(data)
+            self.version += 1
+
+    def _write_snapshot(self, data):
+        raw = _dump(data)
+        base = _digest(raw)
+        header = json.dumps({"base": base}) + "\n"
+        write_atomic(self.path, raw)
+        write_atomic(self.journal, header.encode("utf-8"))
+        self.base = base
+        self.journal_base = base
+        self.journal_offset = len(header)
+        self.journal_ops = 0
+        self.stamp = self._current_stamp()
+
+
+_datasets = {}
+_registry_lock = threading.Lock()
+
+
+def open_json_dataset(name):
+    if name in JOURNALED_DATASETS:
+        return JournaledDataset(dataset_path(name), journal_path(name))
+    return Dataset(dataset_path(name))
+
+
+def json_stamp(name):
+    # mtime/size of the JSON file(s) behind a dataset, whatever the backend
+    return open_json_dataset(name)._current_stamp()
+
+
+def open_dataset(name):
+    if STORAGE == "sqlite":
+        from . import sqlite_store
+
+        if name in sqlite_store.TABLES:
+            return sqlite_store.SqliteDataset(name)
+    return open_json_dataset(name)
+
+
+def get_dataset(name):
+    dataset = _datasets.get(name)
+    if dataset is None:
+        with _registry_lock:
+            dataset = _datasets.get(name)
+            if dataset is None:
+                dataset = open_dataset(name)
+                _datasets[name] = dataset
+    return dataset
+
+
+def load(name):
+    return get_dataset(name).load()
+
+
+def save(name, data):
+    get_dataset(name).save(data)
+
+
+# Single-entry edits. insert() returns None if the key is already taken,
+# update() returns the new entry and update()/delete() return None/False when
+# the entry was changed or deleted since expected_version was read. update()
+# returns DUPLICATE when it would rename the entry to another entry's key.
+
+def get_entry(name, entry_id):
+    return get_dataset(name).get(entry_id)
+
+
+def find(name, key):
+    # Case-insensitive lookup by "word" (or "idiom"), None if missing
+    return get_dataset(name).find(key)
+
+
+def search(name, query, limit=50):
+    # Indexed full-text search, or None when the backend doesn't have one
+    dataset = get_dataset(name)
+    if not hasattr(dataset, "search"):
+        return None
+    return dataset.search(query, limit)
+
+
+def insert(name, entry):
+    return get_dataset(name).insert(entry)
+
+
+def update(name, entry_id, expected_version, entry):
+    return get_dataset(name).update(entry_id, expected_version, entry)
+
+
+def delete(name, entry_id, expected_version):
+    return get_dataset(name).delete(entry_id, expected_version)
+
+
+def apply_batch(name, ops):
+    # Bulk edits committed together, see IndexedDataset._batch for the ops
+    return get_dataset(name).apply_batch(ops)
+
+
+def compact(name):
+    get_dataset(name).compact()
+
+
+def writing(name):
+    # Context manager holding the dataset's write lock (see Dataset.writing),
+    # for read-check-write sequences such as dedup --apply
+    return get_dataset(name).writing()
+
+
+def version(name):
+    # Bumped every time the in-memory copy changes; handy as a cache key for
+    # anything derived from the dataset
+    dataset = get_dataset(name)
+    dataset.load()
+    return dataset.version
@@ -0,0 +1,158 @@
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import sys
+import time
+from collections import deque
+
+from . import distractors, misspellings, questions
+
+# Seeded bulk generation of quiz decks, e.g. for printed worksheets.
+#
+#     python -m vocab_core.decks --count 1000000 --seed 7 --output deck.jsonl
+#     python -m vocab_core.decks --count 500 --modules idioms --output deck.csv
+#
+# The deck is cut into fixed-size shards; shard k draws everything (module,
+# item, question type, distractors, option order) from its own
+# random.Random(f"{seed}/{k}"), so its questions don't depend on which
+# process makes it or on how many processes there are. Shards are generated
+# in a process pool and written in order as they arrive, with only a few in
+# flight at a time, so the deck is never held in memory. The same seed and
+# the same datasets always give the same file.
+
+MODULES = ["vocab", "spelling", "onewords", "idioms"]
+SHARD_SIZE = 10000
+# Decks at least this big are generated in a process pool
+PROCESS_POOL_MIN_QUESTIONS = 20000
+
+CSV_COLUMNS = ["id", "module", "question_type", "prompt",
+               "option_1", "option_2", "option_3", "option_4", "answer"]
+
+
+def random_question(module, rng):
+    # A question about a uniformly drawn item; rng makes every choice
+    if module == "spelling":
+        bank = misspellings.get_bank()
+        return questions.spelling_question_at(bank, rng.choice(bank.words), rng)
+    pools = distractors.get_pools(module)
+    builder = {
+        "vocab": questions.vocab_question_at,
+        "onewords": questions.oneword_question_at,
+        "idioms": questions.idiom_question_at,
+    }[module]
+    return builder(pools, rng.randrange(len(pools)), rng)
+
+
+def prompt_text(module, question):
+    # (question type, plain-text prompt) as the quiz pages word them
+    if module == "vocab":
+        word = question["word"]
+        return question["question_type"], {
+            "meaning": f"What is the meaning of {word}?",
+            "synonym": f"Choose a synonym for {word}:",
+            "antonym": f"Choose an antonym for {word}:",
+        }[question["question_type"]]
+    if module == "spelling":
+        return "spelling", "Select the correctly spelt word:"
+    if module == "onewords":
+        return "oneword", f"What is the one word substitution for: {question['word']}?"
+    if question["quiz_type"] == "idiom_to_meaning":
+        return question["quiz_type"], f"What is the meaning of this idiom: {question['prompt']}?"
+    return question["quiz_type"], f"What is the idiom for this meaning: {question['prompt']}?"
+
+
+def generate_shard(task):
+    # The shard's questions, already formatted as a chunk of output text
+    seed, shard, start, count, modules, fmt = task
+    rng = random.Random(f"{seed}/{shard}")
+    out = io.StringIO()
+    writer = csv.writer(out) if fmt == "csv" else None
+    for number in range(start + 1, start + count + 1):
+        module = rng.choice(modules)
+        question = random_question(module, rng)
+        if writer is None:
+            out.write(json.dumps(dict(question, id=number, module=module), ensure_ascii=False) + "\n")
+        else:
+            question_type, prompt = prompt_text(module, question)
+            writer.writerow([number, module, question_type, prompt, *question["options"],
+                             question["correct_answer"]])
+    return out.getvalue()
+
+
+def _tasks(count, seed, modules, fmt, shard_size):
+    for shard, start in enumerate(range(0, count, shard_size)):
+        yield seed, shard, start, min(shard_size, count - start), modules, fmt
+
+
+def _generate(tasks, workers):
+    # Chunks in shard order
+    if workers == 1:
+        for task in tasks:
+            yield generate_shard(task)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import get_context
+
+    workers = workers or os.cpu_count() or 1
+
+    # spawn: forking a process that runs Streamlit's threads isn't safe
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+        # A bounded window of shards in flight keeps memory flat
+        window = deque()
+        for task in tasks:
+            window.append(pool.submit(generate_shard, task))
+            if len(window) >= 2 * workers:
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
+
+
+def write_deck(path, count, seed=0, modules=MODULES, fmt=None, workers=None, shard_size=SHARD_SIZE):
+    # Writes the deck; returns the number of shards
+    fmt = fmt or ("csv" if path.lower().endswith(".csv") else "jsonl")
+    # Build the misspelling bank (and its stored file) once, before workers
+    # start reading it
+    if "spelling" in modules:
+        misspellings.get_bank()
+    if count < PROCESS_POOL_MIN_QUESTIONS:
+        workers = 1
+    shards = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            csv.writer(f).writerow(CSV_COLUMNS)
+        for chunk in _generate(_tasks(count, seed, list(modules), fmt, shard_size), workers):
+            f.write(chunk)
+            shards += 1
+    return shards
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a reproducible deck of quiz questions")
+    parser.add_argument("--count", type=int, required=True, help="number of questions")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--modules", default=",".join(MODULES),
+                        help=f"comma-separated, any of {', '.join(MODULES)}")
+    parser.add_argument("--output", required=True, help=".jsonl or .csv file")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="default: from the file extension")
+    parser.add_argument("--workers", type=int, help="processes (default: all CPUs)")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE,
+                        help="questions per shard; part of what the seed reproduces")
+    args = parser.parse_args(argv)
+    modules = [m.strip() for m in args.modules.split(",") if m.strip()]
+    unknown = set(modules) - set(MODULES)
+    if unknown or not modules:
+        parser.error(f"unknown modules: {', '.join(sorted(unknown))}" if unknown else "no modules given")
+
+    started = time.perf_counter()
+    shards = write_deck(args.output, args.count, args.seed, modules, args.format, args.workers, args.shard_size)
+    elapsed = time.perf_counter() - started
+    print(f"{args.count} questions in {shards} shards, {elapsed:.1f}s "
+          f"({args.count / elapsed if elapsed else 0:.0f}/s) -> {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,385 @@
+import argparse
+import json
+import re
+import sys
+import time
+
+from . import dataset_store
+
+# Offline clean-up of the vocab dataset: normalization plus near-duplicate
+# detection among words, synonyms and antonyms.
+#
+#     python -m vocab_core.dedup --report dedup-report.json
+#     python -m vocab_core.dedup --output cleaned.json     # or --apply
+#
+# Normalization trims and collapses whitespace, strips annotations
+# ("Acquiesce (UnWilling accept)" -> "Acquiesce"), splits glued glosses whose
+# halves are words in their own right ("Heed-listen" -> "Heed", "Listen"),
+# gives lowercase values the casing most of the dataset uses and drops
+# repeated values and words listed as their own synonym.
+#
+# Near-duplicates ("Desonance" / "Dissonance") are found without comparing
+# all pairs: every distinct value is put in the blocks of its few rarest
+# trigrams, so similar spellings almost always meet in some block, and each
+# block is scored with one rapidfuzz process.cdist call (split into length
+# bands when a block is very large), spread over a process pool for big
+# corpora. Matching values are grouped; a group's canonical form is its
+# headword, else its most used value. A variant is merged automatically only
+# when it's rarer than the canonical form, directly similar to it and listed
+# alongside at least one of the same words somewhere ("Insolent" and
+# "Indolent" never are); two headwords, equally common or unrelated values
+# and chained matches go to the review list.
+# A value and its negation ("Friendly" / "Unfriendly") never match.
+# rapidfuzz and numpy are imported on first use.
+
+LIST_FIELDS = ("synonyms", "antonyms")
+
+DEFAULT_THRESHOLD = 85
+# Values shorter than this aren't fuzzily compared: too many false matches
+MIN_LENGTH = 5
+# Block keys per value: its rarest trigrams
+BLOCK_KEYS = 4
+# Bigger blocks are compared in overlapping bands of this many, by length
+MAX_BLOCK = 2000
+# Corpora at least this big are scored in a process pool
+PROCESS_POOL_MIN_VALUES = 20000
+# Rough comparisons per pool task
+TASK_COMPARISONS = 2_000_000
+
+# "Friendly" / "Unfriendly" are as similar as a typo, and opposites
+NEGATION_PREFIXES = ("un", "in", "im", "il", "ir", "dis", "non", "mis")
+
+WHITESPACE = re.compile(r"\s+")
+ANNOTATION = re.compile(r"\s*-?\s*\(.*\)\s*$")
+GLOSS = re.compile(r"([A-Za-z]+)-([A-Za-z]+)")
+COMPARABLE = re.compile(r"[a-z][a-z' -]*")
+
+
+def _clean(value):
+    return WHITESPACE.sub(" ", value).strip()
+
+
+def _capitalized_style(entries):
+    # Whether most words and list values start with a capital letter
+    upper = lower = 0
+    for entry in entries:
+        for value in [entry.get("word", "")] + [v for f in LIST_FIELDS for v in entry.get(f) or ()]:
+            if value[:1].isupper():
+                upper += 1
+            elif value[:1].islower():
+                lower += 1
+    return upper >= lower
+
+
+def _case(value, capitalized):
+    if value.isupper() and len(value) > 3:
+        value = value.lower()
+    if capitalized and value[:1].islower():
+        return value[:1].upper() + value[1:]
+    return value
+
+
+def normalize_entries(entries):
+    # Returns (normalized copies of entries, list of changes)
+    capitalized = _capitalized_style(entries)
+    # Lowercased values that also occur on their own, for gloss splitting
+    standalone = set()
+    for entry in entries:
+        standalone.add(_clean(entry.get("word", "")).lower())
+        for field in LIST_FIELDS:
+            standalone.update(_clean(value).lower() for value in entry.get(field) or ())
+
+    cleaned = []
+    changes = []
+    for entry in entries:
+        new = dict(entry)
+        word = _case(_clean(entry.get("word", "")), capitalized)
+        if word != entry.get("word"):
+            changes.append({"word": word, "field": "word", "from": entry.get("word"), "to": [word]})
+        new["word"] = word
+        for field in LIST_FIELDS:
+            values = []
+            seen = {word.lower()}
+            for original in entry.get(field) or ():
+                value = _clean(original)
+                value = ANNOTATION.sub("", value) or value
+                parts = [value]
+                gloss = GLOSS.fullmatch(value)
+                if gloss and all(part.lower() in standalone for part in gloss.groups()):
+                    parts = list(gloss.groups())
+                kept = []
+                for part in parts:
+                    part = _case(part, capitalized)
+                    if part.lower() not in seen:
+                        seen.add(part.lower())
+                        kept.append(part)
+                values += kept
+                if kept != [original]:
+                    changes.append({"word": word, "field": field, "from": original, "to": kept})
+            new[field] = values
+        cleaned.append(new)
+    return cleaned, changes
+
+
+def _opposites(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return any(b == prefix + a for prefix in NEGATION_PREFIXES)
+
+
+def _trigrams(key):
+    padded = f" {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def make_blocks(keys):
+    # Lists of indexes into keys that share one of their rarest trigrams
+    grams = [_trigrams(key) for key in keys]
+    frequency = {}
+    for key_grams in grams:
+        for gram in key_grams:
+            frequency[gram] = frequency.get(gram, 0) + 1
+    blocks = {}
+    for i, key_grams in enumerate(grams):
+        for gram in sorted(key_grams, key=lambda g: (frequency[g], g))[:BLOCK_KEYS]:
+            blocks.setdefault(gram, []).append(i)
+    result = []
+    for members in blocks.values():
+        if len(members) < 2:
+            continue
+        if len(members) <= MAX_BLOCK:
+            result.append(members)
+            continue
+        # Similar strings have similar lengths: overlapping bands by length
+        members.sort(key=lambda i: len(keys[i]))
+        half = MAX_BLOCK // 2
+        for start in range(0, len(members) - half, half):
+            result.append(members[start:start + MAX_BLOCK])
+    return result
+
+
+_worker_keys = []
+
+
+def _init_worker(keys):
+    global _worker_keys
+    _worker_keys = keys
+
+
+def _score_blocks(blocks, keys=None, threshold=DEFAULT_THRESHOLD):
+    # (i, j, score) for every pair i < j in a block scoring >= threshold
+    import numpy as np
+    from rapidfuzz import fuzz, process
+
+    keys = _worker_keys if keys is None else keys
+    pairs = []
+    for members in blocks:
+        strings = [keys[i] for i in members]
+        scores = process.cdist(strings, strings, scorer=fuzz.ratio, score_cutoff=threshold,
+                               dtype=np.uint8, workers=1)
+        rows, cols = np.nonzero(np.triu(scores, 1))
+        for row, col in zip(rows.tolist(), cols.tolist()):
+            i, j = members[row], members[col]
+            if _opposites(keys[i], keys[j]):
+                continue
+            pairs.append((min(i, j), max(i, j), int(scores[row, col])))
+    return pairs
+
+
+def _score_task(task):
+    blocks, threshold = task
+    return _score_blocks(blocks, threshold=threshold)
+
+
+def find_pairs(keys, threshold=DEFAULT_THRESHOLD, workers=None):
+    # {(i, j): score} for similar keys, i < j
+    blocks = make_blocks(keys)
+    if len(keys) < PROCESS_POOL_MIN_VALUES or workers == 1:
+        found = _score_blocks(blocks, keys, threshold)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        from multiprocessing import get_context
+
+        tasks = []
+        task, comparisons = [], 0
+        for members in blocks:
+            task.append(members)
+            comparisons += len(members) ** 2
+            if comparisons >= TASK_COMPARISONS:
+                tasks.append((task, threshold))
+                task, comparisons = [], 0
+        if task:
+            tasks.append((task, threshold))
+        found = []
+        # spawn: forking a process that runs Streamlit's threads isn't safe
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=get_context("spawn"),
+            initializer=_init_worker, initargs=(keys,),
+        ) as pool:
+            for part in pool.map(_score_task, tasks):
+                found += part
+    return {(i, j): score for i, j, score in found}
+
+
+def _groups(count, pairs):
+    # Connected components (of size > 1) of the pair graph, union-find
+    parent = list(range(count))
+
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in pairs:
+        parent[root(i)] = root(j)
+    groups = {}
+    for i in {k for pair in pairs for k in pair}:
+        groups.setdefault(root(i), []).append(i)
+    return list(groups.values())
+
+
+def detect(entries, threshold=DEFAULT_THRESHOLD, workers=None):
+    # (merges {variant key: canonical spelling}, merged groups, review groups, stats)
+    from rapidfuzz import fuzz
+
+    spellings = {}
+    counts = {}
+    headwords = set()
+    # Lowercased value -> positions of the entries it appears in
+    places = {}
+    for position, entry in enumerate(entries):
+        headwords.add(entry["word"].lower())
+        for value in [entry["word"]] + [v for field in LIST_FIELDS for v in entry.get(field) or ()]:
+            key = value.lower()
+            spellings.setdefault(key, value)
+            counts[key] = counts.get(key, 0) + 1
+            places.setdefault(key, []).append(position)
+
+    def context(key):
+        # Everything listed alongside key
+        words = set()
+        for position in places[key]:
+            entry = entries[position]
+            words.add(entry["word"].lower())
+            for field in LIST_FIELDS:
+                words.update(value.lower() for value in entry.get(field) or ())
+        return words
+
+    keys = [key for key in spellings if len(key) >= MIN_LENGTH and COMPARABLE.fullmatch(key)]
+    pairs = find_pairs(keys, threshold, workers)
+
+    merges = {}
+    merged = []
+    review = []
+    for group in _groups(len(keys), pairs):
+        members = sorted((keys[i] for i in group),
+                         key=lambda key: (key not in headwords, -counts[key], key))
+        canonical = members[0]
+        variants = []
+        doubtful = []
+        for key in members[1:]:
+            score = fuzz.ratio(key, canonical)
+            info = {"value": spellings[key], "count": counts[key], "score": round(score)}
+            rarer = canonical in headwords or counts[key] < counts[canonical]
+            # A typo sits among the same words as the real thing
+            related = bool((context(key) & context(canonical)) - {key, canonical})
+            if key not in headwords and rarer and related and score >= threshold:
+                merges[key] = spellings[canonical]
+                variants.append(info)
+            else:
+                doubtful.append(dict(info, headword=key in headwords))
+        canonical_info = {"value": spellings[canonical], "count": counts[canonical],
+                          "headword": canonical in headwords}
+        if variants:
+            merged.append({"canonical": canonical_info, "variants": variants})
+        if doubtful:
+            review.append({"canonical": canonical_info, "similar": doubtful})
+    stats = {"values": len(spellings), "compared": len(keys), "pairs": len(pairs)}
+    return merges, merged, review, stats
+
+
+def apply_merges(entries, merges):
+    # Copies of entries with variants replaced by their canonical spelling
+    cleaned = []
+    for entry in entries:
+        new = dict(entry)
+        for field in LIST_FIELDS:
+            values = []
+            seen = {entry["word"].lower()}
+            for value in entry.get(field) or ():
+                value = merges.get(value.lower(), value)
+                if value.lower() not in seen:
+                    seen.add(value.lower())
+                    values.append(value)
+            new[field] = values
+        cleaned.append(new)
+    return cleaned
+
+
+def run(threshold=DEFAULT_THRESHOLD, workers=None):
+    # Returns (cleaned entries, report, dataset version they were made from)
+    started = time.perf_counter()
+    version = dataset_store.version("vocab")
+    entries = dataset_store.load("vocab")
+    normalized, changes = normalize_entries(entries)
+    merges, merged, review, stats = detect(normalized, threshold, workers)
+    cleaned = apply_merges(normalized, merges)
+    # Bump changed entries' versions so editors holding the old one are refused
+    for before, after in zip(entries, cleaned):
+        if after != before and "version" in after:
+            after["version"] = before["version"] + 1
+    stats.update(
+        entries=len(entries),
+        normalized=len(changes),
+        merged_values=len(merges),
+        changed_entries=sum(1 for before, after in zip(entries, cleaned) if after != before),
+        seconds=round(time.perf_counter() - started, 2),
+    )
+    report = {"threshold": threshold, "stats": stats, "normalized": changes,
+              "merged": merged, "review": review}
+    return cleaned, report, version
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Normalize the vocab dataset and find near-duplicate values")
+    parser.add_argument("--threshold", type=int, default=DEFAULT_THRESHOLD,
+                        help="rapidfuzz ratio (0-100) for two values to count as the same")
+    parser.add_argument("--workers", type=int, help="processes for scoring (default: all CPUs)")
+    parser.add_argument("--report", help="write the full merge report here as JSON")
+    parser.add_argument("--output", help="write the cleaned dataset here")
+    parser.add_argument("--apply", action="store_true", help="replace datasets/vocab.json with the cleaned data")
+    args = parser.parse_args(argv)
+
+    cleaned, report, version = run(args.threshold, args.workers)
+    stats = report["stats"]
+    print(f"{stats['entries']} entries, {stats['values']} distinct values, {stats['pairs']} similar pairs "
+          f"in {stats['seconds']}s")
+    print(f"  {stats['normalized']} values normalized, {stats['merged_values']} merged into "
+          f"{len(report['merged'])} canonical forms, {len(report['review'])} groups to review, "
+          f"{stats['changed_entries']} entries changed")
+    for group in report["merged"][:10]:
+        variants = ", ".join(variant["value"] for variant in group["variants"])
+        print(f"    {variants} -> {group['canonical']['value']}")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1, ensure_ascii=False)
+        print(f"Report written to {args.report}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(cleaned, f, indent=4)
+        print(f"Cleaned dataset written to {args.output}")
+    if args.apply:
+        # Under the write lock, so an edit made from the app while we ran
+        # either shows up as a new version here or waits until we're done
+        with dataset_store.writing("vocab"):
+            if dataset_store.version("vocab") != version:
+                print("vocab changed while deduplicating, nothing saved; run again")
+                return 1
+            dataset_store.save("vocab", cleaned)
+        print("Cleaned dataset saved")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+import bisect
+import random
+import threading
+from array import array
+
+from . import compact, dataset_store, metrics, snapshot
+
+# Precomputed distractor pools for the multiple-choice quizzes.
+#
+# Pools are built over the compact, interned form of the dataset (see
+# compact.py). For each dataset version and field we keep one deduplicated
+# array of the field's values (case-insensitive, first spelling wins) and, in
+# CSR form, the positions of the entries that own each value. Drawing k wrong
+# answers is then rejection sampling over that array: O(k) expected work,
+# skipping the correct answer, anything owned by the question's entry (its
+# other synonyms, say) and anything in an explicit exclude set of lowercased
+# string ids.
+
+DATASET_FIELDS = {
+    "vocab": ("meaning", "synonyms", "antonyms"),
+    "onewords": ("meaning",),
+    "idioms": ("idiom", "meaning"),
+}
+
+# Field naming the item a question is about
+KEY_FIELDS = {"vocab": "word", "onewords": "word", "idioms": "idiom"}
+
+
+class Pool:
+    def __init__(self, records, field):
+        self.table = records.table
+        folded = self.table.folded
+        # Per distinct value: string id of its first spelling, lowercased id
+        self.items = array("i")
+        self.keys = array("i")
+        positions = {}
+        # (value index, owner) pairs, each owner once per value
+        pair_items = array("i")
+        pair_owners = array("i")
+        last_owner = array("i")
+        for owner in range(len(records)):
+            for string_id in records.ids(field, owner):
+                key = folded[string_id]
+                index = positions.get(key)
+                if index is None:
+                    index = positions[key] = len(self.items)
+                    self.items.append(string_id)
+                    self.keys.append(key)
+                    last_owner.append(-1)
+                if last_owner[index] != owner:
+                    last_owner[index] = owner
+                    pair_items.append(index)
+                    pair_owners.append(owner)
+        # Owners of value i are owners[offsets[i]:offsets[i + 1]]
+        counts = [0] * (len(self.items) + 1)
+        for index in pair_items:
+            counts[index + 1] += 1
+        for i in range(1, len(counts)):
+            counts[i] += counts[i - 1]
+        self.offsets = array("i", counts)
+        self.owners = array("i", [0]) * len(pair_owners)
+        cursor = counts[:-1]
+        for index, owner in zip(pair_items, pair_owners):
+            self.owners[cursor[index]] = owner
+            cursor[index] += 1
+
+    def _owned_by(self, i, owner):
+        # Owners of a value are stored in ascending order
+        if owner is None:
+            return False
+        end = self.offsets[i + 1]
+        j = bisect.bisect_left(self.owners, owner, self.offsets[i], end)
+        return j < end and self.owners[j] == owner
+
+    def draw(self, k, exclude=(), owner=None, rng=random):
+        # exclude holds lowercased string ids; owner is the question's entry position
+        picked = []
+        seen = set()
+        size = len(self.items)
+        for _ in range(4 * k + 20):
+            if len(picked) == k or not size:
+                return [self.table[string_id] for string_id in picked]
+            i = rng.randrange(size)
+            if i in seen:
+                continue
+            seen.add(i)
+            if self.keys[i] in exclude or self._owned_by(i, owner):
+                continue
+            picked.append(self.items[i])
+        # Almost everything is excluded (tiny dataset): fall back to a scan
+        rest = [
+            i for i in range(size)
+            if i not in seen and self.keys[i] not in exclude and not self._owned_by(i, owner)
+        ]
+        picked += [self.items[i] for i in rng.sample(rest, min(k - len(picked), len(rest)))]
+        return [self.table[string_id] for string_id in picked]
+
+
+class DistractorPools:
+    def __init__(self, records, fields, key=None):
+        # records: compact.Records; questions take their entries from here
+        self.records = records
+        self.key = key
+        self.pools = {field: Pool(records, field) for field in fields}
+        # Positions of the first entry with each key, sorted by lowercased key
+        self.by_key = array("i")
+        if key is not None:
+            folded = records.table.folded
+            first = {}
+            for i, string_id in enumerate(records.fields[key]):
+                first.setdefault(folded[string_id], i)
+            self.by_key = array("i", sorted(first.values(), key=self._key_of))
+
+    def _key_of(self, position):
+        table = self.records.table
+        return table[table.folded[self.records.fields[self.key][position]]]
+
+    def __len__(self):
+        return len(self.records)
+
+    def entry(self, position):
+        return self.records.entry(position)
+
+    def position(self, item):
+        # Position of the entry named item (case-insensitive), or None
+        key = item.lower()
+        i = bisect.bisect_left(self.by_key, key, key=self._key_of)
+        if i < len(self.by_key) and self._key_of(self.by_key[i]) == key:
+            return self.by_key[i]
+        return None
+
+    def keys(self):
+        # Lowercased item names, one per distinct key, in dataset order
+        return [self._key_of(position) for position in sorted(self.by_key)]
+
+    def draw(self, field, k, exclude=(), owner=None, rng=random):
+        return self.pools[field].draw(k, exclude, owner, rng)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pools(name):
+    # Pools for the current version of the dataset. With the JSON backend
+    # they're built from the compiled snapshot, so serving quizzes neither
+    # parses the JSON files nor keeps their dict form in memory.
+    if dataset_store.STORAGE == "json":
+        # A new snapshot object appears whenever the JSON changed
+        version = source = snapshot.get_snapshot(name)
+    else:
+        version, source = dataset_store.version(name), None
+    cached = _pools.get(name)
+    if cached is not None and cached[0] == version:
+        metrics.cache("distractors.pools", True)
+        return cached[1]
+    with _pools_lock:
+        cached = _pools.get(name)
+        if cached is None or cached[0] != version:
+            metrics.cache("distractors.pools", False)
+            with metrics.span("distractors.build"):
+                if source is None:
+                    source = dataset_store.load(name)
+                records = compact.Records.for_dataset(name, source)
+                pools = DistractorPools(records, DATASET_FIELDS[name], KEY_FIELDS[name])
+            cached = (version, pools)
+            _pools[name] = cached
+        return cached[1]
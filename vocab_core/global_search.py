@@ -0,0 +1,177 @@
+import functools
+import heapq
+import math
+import re
+import threading
+from array import array
+
+from . import dataset_store, metrics
+
+# BM25 full-text search across every dataset.
+#
+# Each dataset gets an inverted index, built once per dataset version: text
+# is lowercased, split into words, stripped of stopwords and crudely stemmed
+# ("patience", "patiently" -> "pati"), and every term maps to a posting list
+# of (entry position, weighted term frequency) in two parallel arrays. Fields
+# are weighted by scaling their term counts, so a hit on the word or idiom
+# itself outranks one in a meaning. A query walks only the posting lists of
+# its own terms; IDF is computed over all datasets together so scores from
+# different datasets compare, and the per-dataset match counts are the facets.
+# Antonyms are left out on purpose: "patient" shouldn't find "impatient".
+
+# Dataset -> {field: weight}; spelling.json is a plain list of words
+DATASET_FIELDS = {
+    "vocab": {"word": 3.0, "synonyms": 1.5, "meaning": 1.0},
+    "onewords": {"word": 3.0, "meaning": 1.0},
+    "idioms": {"idiom": 2.0, "meaning": 1.0},
+    "spelling": {"word": 3.0},
+}
+
+K1 = 1.2
+B = 0.75
+DEFAULT_LIMIT = 20
+
+TOKEN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+STOPWORDS = frozenset("""
+a an and are as at be been being but by can do does for from has have how i
+in is it its me means meaning mean my of on or that the their them there
+these this to was what when where which who why will with word words you your
+""".split())
+
+# Longest first; the stem must keep at least 3 letters
+SUFFIXES = (
+    "iness", "ingly", "ously", "ation", "ement", "ness", "ment", "ence", "ance", "ency",
+    "ancy", "able", "ible", "ful", "ing", "ous", "ive", "ent", "ant", "ies",
+    "ied", "ily", "ed", "ly", "es", "er", "s", "y", "e",
+)
+
+
+@functools.lru_cache(maxsize=100_000)
+def stem(word):
+    # Two rounds, so "patiently" -> "patient" -> "pati"
+    for _ in range(2):
+        for suffix in SUFFIXES:
+            if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+                word = word[:-len(suffix)]
+                break
+        else:
+            break
+    return word
+
+
+def tokenize(text):
+    # Terms of text, in order, stopwords dropped
+    return [stem(token) for token in TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class InvertedIndex:
+    def __init__(self, entries, fields):
+        self.entries = entries
+        postings = {}
+        lengths = array("f")
+        for position, entry in enumerate(entries):
+            if isinstance(entry, str):
+                entry = {"word": entry}
+            counts = {}
+            for field, weight in fields.items():
+                values = entry.get(field) or ""
+                for value in [values] if isinstance(values, str) else values:
+                    for term in tokenize(value):
+                        counts[term] = counts.get(term, 0.0) + weight
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                posting = postings.get(term)
+                if posting is None:
+                    posting = postings[term] = (array("i"), array("f"))
+                posting[0].append(position)
+                posting[1].append(tf)
+        # term -> (entry positions, weighted term frequencies)
+        self.postings = postings
+        self.lengths = lengths
+        self.average_length = (sum(lengths) / len(lengths) if lengths else 0.0) or 1.0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def document_frequency(self, term):
+        posting = self.postings.get(term)
+        return len(posting[0]) if posting else 0
+
+    def score(self, terms, idf):
+        # {entry position: BM25 score} for entries holding any of terms
+        scores = {}
+        lengths = self.lengths
+        norm = K1 / self.average_length
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            weight = idf[term]
+            for position, tf in zip(*posting):
+                denominator = tf + K1 * (1 - B) + norm * B * lengths[position]
+                scores[position] = scores.get(position, 0.0) + weight * tf * (K1 + 1) / denominator
+        return scores
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(name):
+    # Index of the current version of the dataset
+    version = dataset_store.version(name)
+    cached = _indexes.get(name)
+    if cached is not None and cached[0] == version:
+        metrics.cache("search.index", True)
+        return cached[1]
+    with _indexes_lock:
+        cached = _indexes.get(name)
+        if cached is None or cached[0] != version:
+            metrics.cache("search.index", False)
+            with metrics.span("search.index_build"):
+                index = InvertedIndex(dataset_store.load(name), DATASET_FIELDS[name])
+            cached = (version, index)
+            _indexes[name] = cached
+        return cached[1]
+
+
+@metrics.timed("search.bm25")
+def search(query, datasets=None, limit=DEFAULT_LIMIT, per_dataset=False):
+    # Returns {"results": [{"dataset", "entry", "score"}, ...] best first,
+    # "facets": {dataset: matching entries}}; datasets restricts the results
+    # but the facets always count every dataset. per_dataset keeps the best
+    # limit of each dataset rather than overall, so the caller can narrow
+    # the datasets afterwards without searching again.
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return {"results": [], "facets": {}}
+    indexes = {name: get_index(name) for name in DATASET_FIELDS}
+
+    total = sum(len(index) for index in indexes.values())
+    idf = {}
+    for term in terms:
+        df = sum(index.document_frequency(term) for index in indexes.values())
+        idf[term] = math.log(1 + (total - df + 0.5) / (df + 0.5))
+
+    facets = {}
+    candidates = []
+    for name, index in indexes.items():
+        scores = index.score(terms, idf)
+        if scores:
+            facets[name] = len(scores)
+        if datasets is None or name in datasets:
+            found = ((score, name, position) for position, score in scores.items())
+            if per_dataset:
+                found = heapq.nlargest(limit, found, key=lambda candidate: candidate[0])
+            candidates.extend(found)
+
+    best = heapq.nlargest(len(candidates) if per_dataset else limit, candidates,
+                          key=lambda candidate: candidate[0])
+    return {
+        "results": [
+            {"dataset": name, "entry": indexes[name].entries[position], "score": score}
+            for score, name, position in best
+        ],
+        "facets": facets,
+    }
@@ -0,0 +1,20 @@
+from . import answer_log, metrics, questions, sampler, srs
+
+# Grading a submitted answer, and feeding the result to the user's review
+# schedule, adaptive sampler and answer log.
+
+
+def is_correct(question, answer):
+    return answer == question["correct_answer"]
+
+
+@metrics.timed("grade")
+def grade(user, module, question, answer, latency=None):
+    # Returns whether answer is right; latency is seconds since the question was shown
+    correct = is_correct(question, answer)
+    item = question["item"]
+    if module in questions.SRS_MODULES:
+        srs.record_answer(user, module, item, correct)
+    sampler.observe(user, module, item, correct)
+    answer_log.record(user, module, item, correct, latency)
+    return correct
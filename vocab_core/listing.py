@@ -0,0 +1,92 @@
+import bisect
+import threading
+from collections import OrderedDict
+
+from . import dataset_store, metrics, snapshot
+
+# Server-side paging for the "View Words" listing.
+#
+# With the JSON backend the listing reads the compiled vocab snapshot
+# (snapshot.py): the A → Z order and the lowercased words are already in the
+# file, filters are a byte search over its key heap and a page decodes only
+# its own page_size entries, so nothing is parsed up front. With SQLite a
+# snapshot.EntryList provides the same interface over the loaded entries.
+# Filtered views are kept in a small LRU so paging through a filter doesn't
+# rescan.
+
+SORT_ORDERS = ["Added", "A → Z", "Z → A"]
+PAGE_SIZES = [10, 25, 50, 100]
+MAX_CACHED_VIEWS = 32
+
+
+class Listing:
+    def __init__(self, source):
+        # source: a snapshot.Overlay or a snapshot.EntryList
+        self.source = source
+        self.orders = {
+            "Added": source.order,
+            "A → Z": source.by_key,
+            "Z → A": source.by_key[::-1],
+        }
+        self.views = OrderedDict()
+        self.lock = threading.Lock()
+
+    def view(self, sort="Added", query=""):
+        # Entry positions matching query (substring of the word), in sort order
+        query = query.strip().lower()
+        order = self.orders[sort]
+        if not query:
+            return order
+        cache_key = (sort, query)
+        with self.lock:
+            view = self.views.get(cache_key)
+            if view is not None:
+                self.views.move_to_end(cache_key)
+                return view
+        matches = self.source.matching(query)
+        if sort == "Added":
+            view = matches
+        else:
+            matches = set(matches)
+            view = [i for i in order if i in matches]
+        with self.lock:
+            self.views[cache_key] = view
+            if len(self.views) > MAX_CACHED_VIEWS:
+                self.views.popitem(last=False)
+        return view
+
+    def page(self, page, page_size, sort="Added", query=""):
+        # Returns (entries on the page, total matches); page is 1-based
+        view = self.view(sort, query)
+        start = (page - 1) * page_size
+        return [self.source[i] for i in view[start:start + page_size]], len(view)
+
+    def letter_page(self, letter, page_size, query=""):
+        # Page of the A → Z view holding the first word starting with letter
+        view = self.view("A → Z", query)
+        index = bisect.bisect_left(view, letter.lower(), key=self.source.key)
+        return min(index, max(len(view) - 1, 0)) // page_size + 1
+
+
+_listing = None
+_listing_lock = threading.Lock()
+
+
+def get_listing():
+    global _listing
+    if dataset_store.STORAGE == "json":
+        # A new snapshot object appears whenever the JSON changed
+        stamp = source = snapshot.get_snapshot("vocab")
+    else:
+        stamp, source = dataset_store.version("vocab"), None
+    if _listing is None or _listing[0] != stamp:
+        with _listing_lock:
+            if _listing is None or _listing[0] != stamp:
+                metrics.cache("listing", False)
+                with metrics.span("listing.build"):
+                    if source is None:
+                        source = snapshot.EntryList(dataset_store.load("vocab"))
+                    _listing = (stamp, Listing(source))
+                return _listing[1]
+    metrics.cache("listing", True)
+    return _listing[1]
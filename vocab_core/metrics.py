@@ -0,0 +1,187 @@
+import cProfile
+import functools
+import io
+import math
+import os
+import pstats
+import threading
+import time
+
+# Timing spans and cache counters for the hot paths, kept in process memory.
+#
+# span("name") / @timed("name") record durations into a per-operation
+# log-scale histogram (8 buckets per doubling, from 1 µs), good for
+# p50/p95/p99 within ~9% at any scale. cache("name", hit) counts hits and
+# misses. Everything is off unless VOCAB_METRICS=1 or set_enabled(True):
+# span() then hands back one shared no-op context manager and @timed costs a
+# flag check, so the instrumentation can stay in place.
+#
+# request_profile() asks the next call of a @timed(..., profile=True)
+# function (the quiz widgets) to run under cProfile; the report is kept in
+# last_profile.
+
+BUCKETS_PER_DOUBLING = 8
+BUCKETS = 240
+PROFILE_LINES = 40
+
+_enabled = os.environ.get("VOCAB_METRICS") == "1"
+_lock = threading.Lock()
+# name -> [count, total seconds, max seconds, bucket counts]
+_histograms = {}
+# name -> [hits, misses]
+_caches = {}
+
+_profile_requested = False
+last_profile = None
+
+
+def enabled():
+    return _enabled
+
+
+def set_enabled(on):
+    global _enabled
+    _enabled = bool(on)
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _caches.clear()
+
+
+def _bucket(seconds):
+    micros = seconds * 1e6
+    if micros <= 1:
+        return 0
+    return min(int(math.log2(micros) * BUCKETS_PER_DOUBLING) + 1, BUCKETS - 1)
+
+
+def _bucket_upper(index):
+    # Upper bound of a bucket, in seconds
+    return 2 ** (index / BUCKETS_PER_DOUBLING) / 1e6
+
+
+def record(name, seconds):
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = [0, 0.0, 0.0, [0] * BUCKETS]
+        histogram[0] += 1
+        histogram[1] += seconds
+        histogram[2] = max(histogram[2], seconds)
+        histogram[3][_bucket(seconds)] += 1
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name):
+    if not _enabled:
+        return _NO_SPAN
+    return _Span(name)
+
+
+def cache(name, hit):
+    if not _enabled:
+        return
+    with _lock:
+        counts = _caches.get(name)
+        if counts is None:
+            counts = _caches[name] = [0, 0]
+        counts[0 if hit else 1] += 1
+
+
+def request_profile():
+    global _profile_requested
+    _profile_requested = True
+
+
+def _run_profiled(name, fn, args, kwargs):
+    global last_profile
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(fn, *args, **kwargs)
+    finally:
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_LINES)
+        last_profile = {"name": name, "time": time.time(), "report": out.getvalue()}
+
+
+def timed(name, profile=False):
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            global _profile_requested
+            if profile and _profile_requested:
+                with _lock:
+                    claimed, _profile_requested = _profile_requested, False
+                if claimed:
+                    with span(name):
+                        return _run_profiled(name, fn, args, kwargs)
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _percentile(buckets, count, p):
+    target = count * p / 100
+    seen = 0
+    for index, n in enumerate(buckets):
+        seen += n
+        if n and seen >= target:
+            return _bucket_upper(index)
+    return 0.0
+
+
+def snapshot():
+    # {"operations": {name: stats in ms}, "caches": {name: counts}}
+    with _lock:
+        histograms = {name: (h[0], h[1], h[2], list(h[3])) for name, h in _histograms.items()}
+        caches = {name: tuple(c) for name, c in _caches.items()}
+    operations = {}
+    for name, (count, total, longest, buckets) in sorted(histograms.items()):
+        operations[name] = {
+            "count": count,
+            "mean_ms": total / count * 1000,
+            # Bucket bounds can overshoot the slowest call; cap at it
+            "p50_ms": min(_percentile(buckets, count, 50), longest) * 1000,
+            "p95_ms": min(_percentile(buckets, count, 95), longest) * 1000,
+            "p99_ms": min(_percentile(buckets, count, 99), longest) * 1000,
+            "max_ms": longest * 1000,
+        }
+    return {
+        "operations": operations,
+        "caches": {
+            name: {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses)}
+            for name, (hits, misses) in sorted(caches.items())
+        },
+    }
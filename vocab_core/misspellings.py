@@ -0,0 +1,405 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+from . import dataset_store, metrics
+
+# Precomputed bank of plausible misspellings for the spelling quiz.
+#
+# Every quiz word (vocab words, synonyms and antonyms, plus spelling.json)
+# gets a fixed list of misspellings of the kinds people actually make:
+# confused suffixes, ie/ei swaps, doubled and dropped letters, swapped
+# neighbours and keyboard-adjacent typos. Candidates that are themselves a
+# known word are discarded. The bank is persisted next to the datasets. A
+# full build only generates words without a stored entry (across a process
+# pool for large batches) and re-filters everything against the current
+# known words; after that, vocab edits update it word by word (LiveBank). A
+# question is then a dict lookup.
+
+BANK_PATH = os.path.join(dataset_store.DATASETS_DIR, "misspellings.json")
+
+# Bump when candidate generation changes to invalidate stored banks
+BANK_FORMAT = 1
+
+MAX_PER_WORD = 12
+MIN_PER_WORD = 3
+
+# Batches at least this big are generated in a process pool
+PROCESS_POOL_MIN_WORDS = 5000
+
+SUFFIX_CONFUSIONS = [
+    ("ance", "ence"), ("ancy", "ency"), ("ant", "ent"), ("able", "ible"),
+    ("ise", "ize"), ("tion", "sion"), ("ary", "ery"), ("er", "or"),
+    ("ous", "us"), ("ful", "full"), ("ly", "ley"), ("cede", "ceed"),
+    ("ite", "ate"), ("al", "el"),
+]
+
+KEYBOARD_ROWS = ["qwertyuiop", "asdfghjkl", "zxcvbnm"]
+
+# Letters only; phrases and annotated entries make poor spelling questions
+QUIZ_WORD = re.compile(r"^[A-Za-z]{4,}$")
+
+
+def _keyboard_neighbours():
+    neighbours = {}
+    for r, row in enumerate(KEYBOARD_ROWS):
+        for i, key in enumerate(row):
+            near = set(row[max(i - 1, 0):i + 2])
+            # Rows are staggered: above sits at i and i+1, below at i-1 and i
+            if r > 0:
+                near.update(KEYBOARD_ROWS[r - 1][i:i + 2])
+            if r < len(KEYBOARD_ROWS) - 1:
+                near.update(KEYBOARD_ROWS[r + 1][max(i - 1, 0):i + 1])
+            near.discard(key)
+            neighbours[key] = "".join(sorted(near))
+    return neighbours
+
+
+KEYBOARD_NEIGHBOURS = _keyboard_neighbours()
+
+
+def _suffix_confusions(word):
+    for a, b in SUFFIX_CONFUSIONS:
+        for old, new in ((a, b), (b, a)):
+            if word.endswith(old) and len(word) > len(old) + 1:
+                yield word[:-len(old)] + new
+    for old, new in (("ie", "ei"), ("ei", "ie")):
+        i = word.find(old)
+        if i >= 0:
+            yield word[:i] + new + word[i + 2:]
+
+
+def _doubling(word):
+    for i in range(1, len(word)):
+        if word[i] == word[i - 1]:
+            # accommodate -> acommodate
+            yield word[:i] + word[i + 1:]
+        elif word[i] not in "aeiouy" and word[i - 1] in "aeiou":
+            # necessary -> neccessary
+            yield word[:i] + word[i] + word[i:]
+
+
+def _dropped_letters(word):
+    # Skip the first letter, people rarely get that wrong
+    for i in range(1, len(word)):
+        if word[i] != word[i - 1]:
+            yield word[:i] + word[i + 1:]
+
+
+def _transpositions(word):
+    for i in range(1, len(word) - 1):
+        if word[i] != word[i + 1]:
+            yield word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def _keyboard_typos(word):
+    for i in range(1, len(word)):
+        for key in KEYBOARD_NEIGHBOURS.get(word[i], ""):
+            yield word[:i] + key + word[i + 1:]
+
+
+GENERATORS = [_suffix_confusions, _doubling, _dropped_letters, _transpositions, _keyboard_typos]
+
+
+def generate_candidates(word, known):
+    # Deterministic: round-robin over the kinds of mistakes, most plausible
+    # kinds first, so every word gets a varied list
+    lower = word.lower()
+    kinds = [[c for c in generator(lower)] for generator in GENERATORS]
+    seen = {lower}
+    candidates = []
+    for round_ in range(max((len(kind) for kind in kinds), default=0)):
+        for kind in kinds:
+            if round_ < len(kind):
+                candidate = kind[round_]
+                if candidate not in seen and candidate not in known:
+                    seen.add(candidate)
+                    candidates.append(candidate)
+        if len(candidates) >= MAX_PER_WORD:
+            break
+    if word[:1].isupper():
+        candidates = [c[:1].upper() + c[1:] for c in candidates]
+    return candidates[:MAX_PER_WORD]
+
+
+_worker_known = frozenset()
+
+
+def _init_worker(known):
+    global _worker_known
+    _worker_known = known
+
+
+def _generate_chunk(words):
+    return {word: generate_candidates(word, _worker_known) for word in words}
+
+
+def generate_bank(words, known):
+    if len(words) < PROCESS_POOL_MIN_WORDS:
+        return {word: generate_candidates(word, known) for word in words}
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import get_context
+
+    bank = {}
+    chunk = 1000
+    chunks = [words[i:i + chunk] for i in range(0, len(words), chunk)]
+    # spawn: forking a process that runs Streamlit's threads isn't safe
+    with ProcessPoolExecutor(
+        mp_context=get_context("spawn"), initializer=_init_worker, initargs=(known,)
+    ) as pool:
+        for part in pool.map(_generate_chunk, chunks):
+            bank.update(part)
+    return bank
+
+
+def _possible_sources(key):
+    # Every word the generators could turn into key: one letter inserted,
+    # dropped, replaced or swapped with its neighbour, or a suffix or ie/ei
+    # swap; a superset, the candidate lists have the final say
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    sources = set()
+    for i in range(len(key) + 1):
+        for c in letters:
+            sources.add(key[:i] + c + key[i:])
+    for i in range(len(key)):
+        sources.add(key[:i] + key[i + 1:])
+        for c in letters:
+            sources.add(key[:i] + c + key[i + 1:])
+    for i in range(len(key) - 1):
+        sources.add(key[:i] + key[i + 1] + key[i] + key[i + 2:])
+    for a, b in SUFFIX_CONFUSIONS:
+        for old, new in ((a, b), (b, a)):
+            if key.endswith(new):
+                sources.add(key[:-len(new)] + old)
+    for old, new in (("ie", "ei"), ("ei", "ie")):
+        i = key.find(new)
+        while i >= 0:
+            sources.add(key[:i] + old + key[i + 2:])
+            i = key.find(new, i + 1)
+    return sources
+
+
+def _entry_words(entry):
+    return [entry["word"]] + entry.get("synonyms", []) + entry.get("antonyms", [])
+
+
+def count_words():
+    # ({lowercased quiz word: word}, Counter of every known word lowercased)
+    known = Counter()
+    quiz_words = {}
+    for entry in dataset_store.load("vocab"):
+        for word in _entry_words(entry):
+            known[word.lower()] += 1
+            if QUIZ_WORD.match(word):
+                quiz_words.setdefault(word.lower(), word)
+    for word in dataset_store.load("spelling"):
+        known[word.lower()] += 1
+        if QUIZ_WORD.match(word):
+            quiz_words.setdefault(word.lower(), word)
+    for entry in dataset_store.load("onewords"):
+        known[entry["word"].lower()] += 1
+    return quiz_words, known
+
+
+def collect_words():
+    # (quiz words, every known word lowercased)
+    quiz_words, known = count_words()
+    return list(quiz_words.values()), set(known)
+
+
+class MisspellingBank:
+    def __init__(self, misspellings):
+        self.misspellings = misspellings
+        # Only words with enough misspellings for a full question
+        self.words = [w for w, c in misspellings.items() if len(c) >= MIN_PER_WORD]
+
+
+def _read_stored(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    if stored.get("format") != BANK_FORMAT:
+        return {}
+    return stored.get("words", {})
+
+
+def _write(path, misspellings):
+    raw = json.dumps({"format": BANK_FORMAT, "words": misspellings}, indent=1)
+    dataset_store.write_atomic(path, raw.encode("utf-8"))
+
+
+@metrics.timed("misspellings.build")
+def build_bank(path=BANK_PATH, counts=None):
+    # Full build; counts is count_words() if the caller already has it
+    quiz_words, known = counts or count_words()
+    words = list(quiz_words.values())
+    stored = _read_stored(path)
+    missing = [word for word in words if word not in stored]
+    generated = generate_bank(missing, frozenset(known))
+    misspellings = {}
+    for word in words:
+        candidates = stored[word] if word in stored else generated[word]
+        # Words added since the bank was stored may have made a candidate real
+        misspellings[word] = [c for c in candidates if c.lower() not in known]
+    if missing or len(stored) != len(words):
+        try:
+            _write(path, misspellings)
+        except OSError:
+            # Only the stored copy is lost: the next build regenerates it
+            pass
+    return MisspellingBank(misspellings)
+
+
+SOURCES = ("vocab", "spelling", "onewords")
+
+# Seconds to gather edits before the bank file is rewritten
+SAVE_DELAY = 1.0
+
+
+class LiveBank:
+    # The bank kept in step with the source datasets. Single-entry edits of
+    # vocab (the only dataset edited from the app) come in as dataset
+    # notifications and only touch the words that entry gained or lost: a
+    # new quiz word gets its candidates generated, a newly known word is
+    # dropped from the lists it appears in, and a word no entry uses any more
+    # leaves the bank. The file is rewritten from a background thread, a
+    # burst of edits at a time. A wholesale reload of any source marks the
+    # bank stale and the next get() does a full build_bank().
+
+    def __init__(self, path=BANK_PATH):
+        self.path = path
+        self.datasets = [dataset_store.get_dataset(name) for name in SOURCES]
+        # Notifications arrive under the vocab lock; everything here runs
+        # under it too
+        self.lock = self.datasets[0].lock
+        self.write_lock = threading.Lock()
+        self.stale = True
+        self.bank = None
+        self.quiz_words = {}
+        self.known = Counter()
+        self.dirty = False
+        self.saving = False
+        for dataset in self.datasets:
+            dataset.subscribe(self._on_change)
+
+    def get(self):
+        # Loading the sources first picks up edits made by other processes
+        for dataset in self.datasets:
+            dataset.load()
+        if not self.stale:
+            metrics.cache("misspellings.bank", True)
+            return self.bank
+        with self.lock:
+            if self.stale:
+                metrics.cache("misspellings.bank", False)
+                counts = count_words()
+                with self.write_lock:
+                    self.bank = build_bank(self.path, counts)
+                self.quiz_words, self.known = counts
+                self.stale = False
+            return self.bank
+
+    def _on_change(self, kind, old, new):
+        if kind == "reset":
+            self.stale = True
+            return
+        if self.stale:
+            return
+        # Occurrences each word gained (or lost) with this edit
+        delta = Counter()
+        spelled = {}
+        if new is not None:
+            for word in _entry_words(new):
+                delta[word.lower()] += 1
+                spelled.setdefault(word.lower(), word)
+        if old is not None:
+            delta.subtract(word.lower() for word in _entry_words(old))
+        learned = set()
+        for key, n in delta.items():
+            if n > 0:
+                if key not in self.known:
+                    learned.add(key)
+                self.known[key] += n
+                if key not in self.quiz_words and QUIZ_WORD.match(key):
+                    self._add(spelled[key])
+            elif n < 0:
+                self.known[key] += n
+                if self.known[key] <= 0:
+                    del self.known[key]
+                    self._remove(key)
+        if learned:
+            self._drop_candidates(learned)
+        if any(delta.values()):
+            self._schedule_save()
+
+    def _add(self, word):
+        self.quiz_words[word.lower()] = word
+        candidates = generate_candidates(word, self.known)
+        self.bank.misspellings[word] = candidates
+        if len(candidates) >= MIN_PER_WORD:
+            self.bank.words.append(word)
+
+    def _remove(self, key):
+        word = self.quiz_words.pop(key, None)
+        if word is None:
+            return
+        candidates = self.bank.misspellings.pop(word, ())
+        if len(candidates) >= MIN_PER_WORD:
+            self.bank.words.remove(word)
+
+    def _drop_candidates(self, keys):
+        # Only words within one generator step of a key can have it as a
+        # candidate; candidates are stored lowercased or capitalized
+        forms = keys | {key[:1].upper() + key[1:] for key in keys}
+        misspellings = self.bank.misspellings
+        for key in keys:
+            for source in _possible_sources(key):
+                word = self.quiz_words.get(source)
+                candidates = misspellings.get(word) if word is not None else None
+                if not candidates or forms.isdisjoint(candidates):
+                    continue
+                kept = [c for c in candidates if c not in forms]
+                # Replaced, not changed in place: the saver may be reading it
+                misspellings[word] = kept
+                if len(kept) < MIN_PER_WORD <= len(candidates):
+                    self.bank.words.remove(word)
+
+    def _schedule_save(self):
+        self.dirty = True
+        if not self.saving:
+            self.saving = True
+            threading.Thread(target=self._save, daemon=True).start()
+
+    def _save(self):
+        try:
+            while True:
+                time.sleep(SAVE_DELAY)
+                with self.lock:
+                    if not self.dirty or self.stale:
+                        self.saving = False
+                        return
+                    self.dirty = False
+                    misspellings = dict(self.bank.misspellings)
+                with self.write_lock:
+                    _write(self.path, misspellings)
+        except OSError:
+            self.saving = False
+
+
+_live = None
+_live_lock = threading.Lock()
+
+
+def get_bank():
+    # Bank for the current contents of the source datasets
+    global _live
+    if _live is None:
+        with _live_lock:
+            if _live is None:
+                _live = LiveBank()
+    return _live.get()
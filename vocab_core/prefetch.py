@@ -0,0 +1,91 @@
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from . import metrics
+
+# Per-session queue of ready-made quiz questions.
+#
+# Each quiz session keeps a few questions queued up. "Next" pops one, and
+# popping schedules a refill on a shared background pool, so the question
+# generator runs between answers instead of on the click. Questions come from
+# a small generator pipeline that drops any item seen within the last
+# `no_repeat` questions (served or still queued).
+
+QUEUE_SIZE = 5
+NO_REPEAT_WINDOW = 10
+
+# Give up on avoiding repeats after this many rejected candidates in a row
+# (datasets smaller than the window)
+MAX_REJECTS = 50
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="prefetch")
+
+
+class QuestionQueue:
+    def __init__(self, generate, key, size=QUEUE_SIZE, no_repeat=NO_REPEAT_WINDOW):
+        # generate() builds one question; key(question) names the item it asks about
+        self.generate = generate
+        self.key = key
+        self.size = size
+        self.ready = deque()
+        self.recent = deque(maxlen=no_repeat)
+        self.lock = threading.Lock()
+        # Generators aren't re-entrant, so one producer at a time
+        self.generator_lock = threading.Lock()
+        self.scheduled = False
+        self.questions = self._pipeline()
+
+    def _pipeline(self):
+        candidates = (self.generate() for _ in itertools.count())
+        rejects = 0
+        for question in candidates:
+            key = self.key(question)
+            with self.lock:
+                blocked = key in self.recent
+            # list() copies in one step, safe while pop() runs concurrently
+            blocked = blocked or any(self.key(q) == key for q in list(self.ready))
+            if blocked and rejects < MAX_REJECTS:
+                rejects += 1
+                continue
+            rejects = 0
+            yield question
+
+    def _next(self):
+        try:
+            return next(self.questions)
+        except Exception:
+            # A generator that raised is finished; start a fresh one
+            self.questions = self._pipeline()
+            raise
+
+    def _refill(self):
+        try:
+            while len(self.ready) < self.size:
+                with self.generator_lock:
+                    question = self._next()
+                self.ready.append(question)
+        except Exception:
+            # pop() will generate on the request path (and raise) next time
+            pass
+        finally:
+            with self.lock:
+                self.scheduled = False
+
+    def pop(self):
+        try:
+            question = self.ready.popleft()
+            metrics.cache("prefetch", True)
+        except IndexError:
+            # Cold queue: first question, or the refill hasn't caught up
+            metrics.cache("prefetch", False)
+            with self.generator_lock:
+                question = self.ready.popleft() if self.ready else self._next()
+        with self.lock:
+            self.recent.append(self.key(question))
+            schedule = not self.scheduled
+            self.scheduled = True
+        if schedule:
+            _executor.submit(self._refill)
+        return question
@@ -0,0 +1,171 @@
+import random
+
+from . import dataset_store, distractors, metrics, misspellings, prefetch, sampler, srs
+
+# Question generators for the quiz modules.
+#
+# Each returns a plain dict with the prompt data, "options", "correct_answer"
+# and "item" (the key the answer is recorded under). The item comes from the
+# user's spaced-repetition schedule when something is due, otherwise from
+# their adaptive sampler, weighted towards what they miss. The *_at builders
+# make the question for a given item and take every random choice from rng,
+# so seeded callers (decks.py) get reproducible questions.
+
+# Modules scheduled with spaced repetition
+SRS_MODULES = {"vocab", "spelling", "idioms"}
+
+
+def _pick_position(user, module, pools):
+    # Entry position in pools.records of the next item to ask about
+    # A new pools object appears whenever the dataset changed
+    weighted = sampler.get_sampler(user, module, pools, pools.keys)
+    if module in SRS_MODULES:
+        item = srs.next_item(user, module, weighted.draw)
+    else:
+        item = weighted.draw()
+    position = pools.position(item) if item is not None else None
+    if position is None:
+        # Reviewed item no longer in the dataset
+        position = random.randrange(len(pools))
+    return position
+
+
+def vocab_question(user):
+    pools = distractors.get_pools("vocab")
+    return vocab_question_at(pools, _pick_position(user, "vocab", pools))
+
+
+def vocab_question_at(pools, question_index, rng=random):
+    question = pools.entry(question_index)
+
+    # Randomly select question type based on data availability
+    possible_types = ["meaning"]
+    if question.get("synonyms"):
+        possible_types.append("synonym")
+    if question.get("antonyms"):
+        possible_types.append("antonym")
+    question_type = rng.choice(possible_types)
+
+    # Never offer one of the word's own synonyms/antonyms as a wrong answer
+    own_words = pools.records.folded_set(question_index, "synonyms", "antonyms")
+
+    if question_type == "meaning":
+        correct_answer = question["meaning"]
+        field = "meaning"
+    elif question_type == "synonym":
+        correct_answer = rng.choice(question["synonyms"])
+        field = "synonyms"
+    else:  # antonym
+        correct_answer = rng.choice(question["antonyms"])
+        field = "antonyms"
+    # The answer plus 3 distractors from the precomputed pools
+    exclude = own_words | pools.records.folded_set(question_index, field)
+    options = pools.draw(field, 3, exclude=exclude, owner=question_index, rng=rng)
+    options.append(correct_answer)
+    rng.shuffle(options)
+
+    return {
+        "word": question["word"],
+        "question_type": question_type,
+        "correct_answer": correct_answer,
+        "options": options,
+        "item": question["word"].lower(),
+    }
+
+
+def spelling_question(user):
+    bank = misspellings.get_bank()
+    bank_version = tuple(dataset_store.version(name) for name in misspellings.SOURCES)
+    weighted = sampler.get_sampler(user, "spelling", bank_version, lambda: bank.words)
+    correct_word = srs.next_item(user, "spelling", weighted.draw)
+    if len(bank.misspellings.get(correct_word, ())) < misspellings.MIN_PER_WORD:
+        # Reviewed word no longer in the bank
+        correct_word = random.choice(bank.words)
+    return spelling_question_at(bank, correct_word)
+
+
+def spelling_question_at(bank, correct_word, rng=random):
+    options = rng.sample(bank.misspellings[correct_word], 3) + [correct_word]
+    rng.shuffle(options)
+
+    return {
+        "word": correct_word,
+        "correct_answer": correct_word,
+        "options": options,
+        "item": correct_word,
+    }
+
+
+def oneword_question(user):
+    pools = distractors.get_pools("onewords")
+    return oneword_question_at(pools, _pick_position(user, "onewords", pools))
+
+
+def oneword_question_at(pools, question_index, rng=random):
+    question = pools.entry(question_index)
+    correct_answer = question["meaning"]
+
+    # 3 distractors from the precomputed meaning pool
+    exclude = pools.records.folded_set(question_index, "meaning")
+    options = pools.draw("meaning", 3, exclude=exclude, owner=question_index, rng=rng)
+    options.append(correct_answer)
+    rng.shuffle(options)
+
+    return {
+        "word": question["word"],
+        "correct_answer": correct_answer,
+        "options": options,
+        "item": question["word"].lower(),
+    }
+
+
+def idiom_question(user):
+    pools = distractors.get_pools("idioms")
+    return idiom_question_at(pools, _pick_position(user, "idioms", pools))
+
+
+def idiom_question_at(pools, question_index, rng=random):
+    question = pools.entry(question_index)
+
+    # Randomly decide quiz type
+    quiz_type = rng.choice(["idiom_to_meaning", "meaning_to_idiom"])
+    if quiz_type == "idiom_to_meaning":
+        prompt = question["idiom"]
+        correct_answer = question["meaning"]
+        field = "meaning"
+    else:
+        prompt = question["meaning"]
+        correct_answer = question["idiom"]
+        field = "idiom"
+
+    # 3 distractors from the precomputed pools
+    exclude = pools.records.folded_set(question_index, field)
+    options = pools.draw(field, 3, exclude=exclude, owner=question_index, rng=rng)
+    options.append(correct_answer)
+    rng.shuffle(options)
+
+    return {
+        "prompt": prompt,
+        "correct_answer": correct_answer,
+        "options": options,
+        "quiz_type": quiz_type,
+        "item": question["idiom"].lower(),
+    }
+
+
+GENERATORS = {
+    "vocab": vocab_question,
+    "spelling": spelling_question,
+    "onewords": oneword_question,
+    "idioms": idiom_question,
+}
+
+
+def new_question(module, user):
+    with metrics.span("question." + module):
+        return GENERATORS[module](user)
+
+
+def question_queue(module, user):
+    # Prefetching queue of the module's questions for one user
+    return prefetch.QuestionQueue(lambda: new_question(module, user), key=lambda q: q["item"])
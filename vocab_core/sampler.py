@@ -0,0 +1,162 @@
+import random
+import threading
+import time
+
+from . import answer_log
+
+# Difficulty-weighted choice of the next quiz item.
+#
+# Every item of a module gets a weight from the user's history with it:
+# unseen items a steady base weight, seen items less, plus extra for their
+# error rate and for recent misses (decaying with a half-life). Draws come
+# from a Walker/Vose alias table, O(1) each. Answers don't rebuild the table:
+# a changed item is marked dirty, draws pick among the dirty items by their
+# new weights (a short scan) or reject them from the table, and the table is
+# rebuilt once DIRTY_LIMIT items changed, the dirty items hold most of its
+# weight, or it is REBUILD_AGE old (so recent misses decay).
+
+UNSEEN_WEIGHT = 1.0
+SEEN_WEIGHT = 0.2
+ERROR_WEIGHT = 3.0
+RECENT_MISS_WEIGHT = 2.0
+MISS_HALF_LIFE = 24 * 60 * 60
+# Recent misses stop adding weight past this many
+MAX_RECENT_MISSES = 3.0
+
+DIRTY_LIMIT = 64
+REBUILD_AGE = 60 * 60
+
+
+class AliasTable:
+    def __init__(self, weights):
+        # Vose's alias method; weights must not all be zero
+        n = len(weights)
+        total = sum(weights)
+        self.prob = [0.0] * n
+        self.alias = list(range(n))
+        scaled = [w * n / total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        # Leftovers are 1 up to rounding error
+        for i in small + large:
+            self.prob[i] = 1.0
+
+    def draw(self, rng=random):
+        i = int(rng.random() * len(self.prob))
+        return i if rng.random() < self.prob[i] else self.alias[i]
+
+
+def _weight(stats, now):
+    if stats is None:
+        return UNSEEN_WEIGHT
+    correct, total, misses, when = stats
+    misses *= 0.5 ** ((now - when) / MISS_HALF_LIFE)
+    recent = min(misses, MAX_RECENT_MISSES)
+    return SEEN_WEIGHT + ERROR_WEIGHT * (total - correct) / total + RECENT_MISS_WEIGHT * recent
+
+
+class AdaptiveSampler:
+    def __init__(self, keys, history=None, now=None):
+        # keys: the module's items; history: {item: [correct, total]}
+        self.keys = list(keys)
+        self.positions = {key: i for i, key in enumerate(self.keys)}
+        now = time.time() if now is None else now
+        # item position -> [correct, total, decayed misses, time of misses]
+        self.stats = {}
+        for key, (correct, total) in (history or {}).items():
+            i = self.positions.get(key)
+            if i is not None and total:
+                self.stats[i] = [correct, total, 0.0, now]
+        self.lock = threading.Lock()
+        self._rebuild(now)
+
+    def _rebuild(self, now):
+        self.weights = [_weight(self.stats.get(i), now) for i in range(len(self.keys))]
+        self.total = sum(self.weights)
+        self.table = AliasTable(self.weights) if self.keys else None
+        self.built = now
+        # position -> new weight, for items changed since the build
+        self.dirty = {}
+        self.dirty_old = 0.0
+        self.dirty_new = 0.0
+
+    def observe(self, key, correct, now=None):
+        i = self.positions.get(key)
+        if i is None:
+            return
+        now = time.time() if now is None else now
+        with self.lock:
+            stats = self.stats.get(i)
+            if stats is None:
+                stats = self.stats[i] = [0, 0, 0.0, now]
+            stats[2] *= 0.5 ** ((now - stats[3]) / MISS_HALF_LIFE)
+            stats[3] = now
+            stats[1] += 1
+            if correct:
+                stats[0] += 1
+            else:
+                stats[2] += 1.0
+            weight = _weight(stats, now)
+            if i in self.dirty:
+                self.dirty_new -= self.dirty[i]
+            else:
+                self.dirty_old += self.weights[i]
+            self.dirty[i] = weight
+            self.dirty_new += weight
+            if len(self.dirty) > DIRTY_LIMIT or self.dirty_old > self.total / 2:
+                self._rebuild(now)
+
+    def draw(self, rng=random):
+        # A key, or None when there are no items
+        if not self.keys:
+            return None
+        with self.lock:
+            if time.time() - self.built > REBUILD_AGE:
+                self._rebuild(time.time())
+            clean = self.total - self.dirty_old
+            if self.dirty and rng.random() * (clean + self.dirty_new) < self.dirty_new:
+                target = rng.random() * self.dirty_new
+                for i, weight in self.dirty.items():
+                    target -= weight
+                    if target < 0:
+                        return self.keys[i]
+                return self.keys[i]
+            # Dirty items hold at most half the table's weight, so this
+            # takes two tries on average at worst
+            while True:
+                i = self.table.draw(rng)
+                if i not in self.dirty:
+                    return self.keys[i]
+
+
+_samplers = {}
+_samplers_lock = threading.Lock()
+
+
+def get_sampler(user, module, version, keys):
+    # Sampler for one user and module; keys() lists the items, and is only
+    # called when version (of the items) changed
+    cached = _samplers.get((user, module))
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    with _samplers_lock:
+        cached = _samplers.get((user, module))
+        if cached is None or cached[0] != version:
+            history = answer_log.summary(user)["items"].get(module, {})
+            cached = (version, AdaptiveSampler(keys(), history))
+            _samplers[(user, module)] = cached
+        return cached[1]
+
+
+def observe(user, module, key, correct):
+    # Feed an answer to the user's sampler, if it has one yet
+    cached = _samplers.get((user, module))
+    if cached is not None:
+        cached[1].observe(key, correct)
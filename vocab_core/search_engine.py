@@ -0,0 +1,192 @@
+import threading
+
+from . import dataset_store, metrics
+
+# Fuzzy search over a dataset, scored in one batched rapidfuzz call.
+#
+# The corpus is built once per dataset version: every searchable string
+# (word, meaning, each synonym/antonym) is lowercased and deduplicated, and
+# flat "occurrence" arrays record which entry and field each use of a string
+# belongs to. A query scores the unique strings with process.cdist on all
+# cores, applies per-field weights through the occurrence arrays, takes each
+# entry's best field and returns the top-k entries above the cutoff.
+#
+# Only strings sharing a trigram with the query (and the few too short to
+# have one) are scored at first: a trigram inverted index over the corpus,
+# built with numpy as flat posting arrays, narrows a query to a fraction of
+# the corpus. Should that turn up fewer than limit entries, the rest of the
+# corpus is scored too, so a query never loses matches it has room for; when
+# it does fill the limit, a typo match sharing no trigram with the query
+# (mostly with short queries) can be left out.
+# numpy and rapidfuzz are imported on first use, not when the module loads.
+
+DATASET_FIELDS = {
+    "vocab": ("word", "meaning", "synonyms", "antonyms"),
+    "onewords": ("word", "meaning"),
+    "idioms": ("idiom", "meaning"),
+}
+
+# Matches on the headword count a little more than matches elsewhere
+DEFAULT_WEIGHTS = {"word": 1.0, "idiom": 1.0, "synonyms": 0.95, "meaning": 0.9, "antonyms": 0.9}
+DEFAULT_CUTOFF = 60
+DEFAULT_LIMIT = 20
+# Trigrams are hashed into at most 2 ** TRIGRAM_BITS posting lists
+TRIGRAM_BITS = 20
+
+
+def _trigram_buckets(codes, bits):
+    # Posting list of each 3-character window of a UTF-32 code array: a
+    # multiplicative hash of the three codes, top bits kept
+    import numpy as np
+
+    buckets = codes[:-2] * np.uint32(0x9E3779B1)
+    buckets ^= codes[1:-1] * np.uint32(0x85EBCA77)
+    buckets ^= codes[2:] * np.uint32(0xC2B2AE3D)
+    buckets *= np.uint32(0x27D4EB2F)
+    buckets >>= np.uint32(32 - bits)
+    return buckets.view(np.int32)
+
+
+def _utf32(text):
+    import numpy as np
+
+    return np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+
+
+class SearchEngine:
+    def __init__(self, entries, fields):
+        import numpy as np
+
+        self.entries = entries
+        self.fields = fields
+        strings = {}
+        occ_string, occ_field, offsets = [], [], []
+        for entry in entries:
+            offsets.append(len(occ_string))
+            for field_index, field in enumerate(fields):
+                values = entry.get(field, "")
+                if isinstance(values, str):
+                    values = [values]
+                for value in values:
+                    occ_string.append(strings.setdefault(value.lower(), len(strings)))
+                    occ_field.append(field_index)
+            if offsets[-1] == len(occ_string):
+                # Keep every entry non-empty so reduceat below lines up
+                occ_string.append(strings.setdefault("", len(strings)))
+                occ_field.append(0)
+        self.corpus = list(strings)
+        self.strings = np.array(self.corpus, dtype=object)
+        self.occ_string = np.array(occ_string, dtype=np.int32)
+        self.occ_field = np.array(occ_field, dtype=np.int8)
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self._index_trigrams()
+
+    def _index_trigrams(self):
+        # Posting list b is trigram_ids[trigram_offsets[b]:trigram_offsets[b + 1]],
+        # the strings containing a trigram that hashes to b. "\0" separates the
+        # strings, so windows across a separator are left out.
+        import numpy as np
+
+        codes = _utf32("\0".join(self.corpus))
+        lengths = np.fromiter(map(len, self.corpus), dtype=np.int64, count=len(self.corpus))
+        self.short_ids = np.flatnonzero(lengths < 3)
+        self.trigram_bits = min(TRIGRAM_BITS, max(len(codes) // 8, 1).bit_length())
+        inside = (codes[:-2] != 0) & (codes[1:-1] != 0) & (codes[2:] != 0)
+        buckets = _trigram_buckets(codes, self.trigram_bits)[inside]
+        del codes, inside
+        counts = np.bincount(buckets, minlength=1 << self.trigram_bits)
+        self.trigram_offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.trigram_offsets[1:])
+        # Sorting bucket << 32 | string id groups the ids by bucket, several
+        # times faster than an argsort of the buckets. A string of length n
+        # has n - 2 windows, in order.
+        keys = buckets.astype(np.int64)
+        del buckets
+        keys <<= 32
+        keys |= np.repeat(np.arange(len(self.corpus), dtype=np.int32), np.maximum(lengths - 2, 0))
+        keys.sort()
+        self.trigram_ids = keys.astype(np.int32)
+
+    def _candidates(self, query):
+        # Mask of the strings sharing a trigram with query, plus those too
+        # short to have one; all of them if query itself is
+        import numpy as np
+
+        if len(query) < 3:
+            return np.ones(len(self.corpus), dtype=bool)
+        mask = np.zeros(len(self.corpus), dtype=bool)
+        mask[self.short_ids] = True
+        offsets, ids = self.trigram_offsets, self.trigram_ids
+        for bucket in np.unique(_trigram_buckets(_utf32(query), self.trigram_bits)):
+            mask[ids[offsets[bucket]:offsets[bucket + 1]]] = True
+        return mask
+
+    def _score(self, query, scores, ids, score_cutoff):
+        import numpy as np
+        from rapidfuzz import fuzz, process
+
+        scores[ids] = process.cdist(
+            [query], self.strings[ids].tolist(), scorer=fuzz.partial_ratio,
+            score_cutoff=score_cutoff, dtype=np.float32, workers=-1,
+        )[0]
+
+    def _best(self, scores, field_weights):
+        import numpy as np
+
+        return np.maximum.reduceat(scores[self.occ_string] * field_weights[self.occ_field], self.offsets)
+
+    @metrics.timed("search.fuzzy")
+    def search(self, query, limit=DEFAULT_LIMIT, weights=None, cutoff=DEFAULT_CUTOFF):
+        # Returns [(entry, score), ...], best first
+        import numpy as np
+
+        query = query.strip().lower()
+        if not query or not self.entries:
+            return []
+        weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        field_weights = np.array([weights.get(field, 1.0) for field in self.fields], dtype=np.float32)
+
+        # A string that can't reach the cutoff even under the largest weight
+        # is dropped inside rapidfuzz (scored 0) without a full comparison
+        raw_cutoff = min(100.0, cutoff / max(float(field_weights.max()), 1e-6))
+        scores = np.zeros(len(self.corpus), dtype=np.float32)
+        candidates = self._candidates(query)
+        self._score(query, scores, np.flatnonzero(candidates), raw_cutoff)
+        best = self._best(scores, field_weights)
+        hits = np.flatnonzero(best >= cutoff)
+        if len(hits) < limit and not candidates.all():
+            # Too few matches among the candidates: score the rest as well
+            self._score(query, scores, np.flatnonzero(~candidates), raw_cutoff)
+            best = self._best(scores, field_weights)
+            hits = np.flatnonzero(best >= cutoff)
+
+        if len(hits) > limit:
+            hits = np.sort(hits[np.argpartition(-best[hits], limit - 1)[:limit]])
+        order = hits[np.argsort(-best[hits], kind="stable")]
+        return [(self.entries[i], float(best[i])) for i in order]
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(name="vocab"):
+    # Shared engine for the current version of the dataset
+    version = dataset_store.version(name)
+    cached = _engines.get(name)
+    if cached is not None and cached[0] == version:
+        metrics.cache("search.engine", True)
+        return cached[1]
+    with _engines_lock:
+        cached = _engines.get(name)
+        if cached is None or cached[0] != version:
+            metrics.cache("search.engine", False)
+            with metrics.span("search.build"):
+                engine = SearchEngine(dataset_store.load(name), DATASET_FIELDS[name])
+            cached = (version, engine)
+            _engines[name] = cached
+        return cached[1]
+
+
+def search(name, query, limit=DEFAULT_LIMIT, weights=None, cutoff=DEFAULT_CUTOFF):
+    return get_engine(name).search(query, limit, weights, cutoff)
@@ -0,0 +1,504 @@
+import argparse
+import bisect
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+
+from . import dataset_store, metrics
+
+# Compiled, memory-mapped snapshots of the JSON datasets.
+#
+#     python -m vocab_core.snapshot                 # compile stale snapshots
+#     python -m vocab_core.snapshot vocab --force
+#
+# datasets/<name>.snap holds a small header (magic, format, JSON metadata
+# with the entry count and the stamp of the source files), then the sections:
+#
+#     offsets      n + 1 uint64   entry i is heap[offsets[i]:offsets[i + 1]]
+#     key_offsets  n + 1 uint64   the same for the lowercased keys
+#     id_offsets   n + 1 uint64   the same for the entry ids
+#     by_key       n uint32       entry positions sorted by lowercased key
+#     by_id        n uint32       entry positions sorted by id
+#     heap                        each entry as compact JSON, back to back
+#     key_heap                    each lowercased key, back to back
+#     id_heap                     each id, back to back
+#
+# The file is opened with mmap, so reading entry i is one offset lookup and a
+# small json.loads, nothing is parsed up front, and every worker process
+# shares the same pages of the OS page cache. The metadata records the
+# mtime/size of the JSON file (and journal) it was compiled from, and for the
+# journaled vocab the snapshot digest and journal offset it got up to.
+#
+# get_snapshot() doesn't recompile on every edit: it returns an Overlay, the
+# last snapshot plus the journal lines written since, and reads only the new
+# lines when the journal grows. When the JSON file itself changes (journal
+# compaction, a bulk import, a hand edit) a new snapshot is compiled in a
+# background thread. Meanwhile an EntryList over a freshly loaded copy of the
+# dataset is served, kept current by replaying the journal into that copy,
+# so edits made during the recompile show up at once. Only a process with no
+# snapshot view yet compiles on the request path.
+
+SNAPSHOT_DATASETS = {"vocab": "word", "onewords": "word", "idioms": "idiom"}
+
+MAGIC = b"EMSNAP\0\0"
+FORMAT = 2
+# magic, format, metadata length
+HEADER = struct.Struct("<8sII")
+
+
+def snapshot_path(name):
+    return os.path.splitext(dataset_store.dataset_path(name))[0] + ".snap"
+
+
+def _jsonable(stamp):
+    return json.loads(json.dumps(stamp))
+
+
+def _align(n):
+    return (n + 7) & ~7
+
+
+def _heap(strings):
+    # (offsets, heap bytes, positions sorted by string) for a string section
+    offsets = array("Q", [0])
+    chunks = []
+    position = 0
+    for string in strings:
+        raw = string.encode("utf-8")
+        position += len(raw)
+        offsets.append(position)
+        chunks.append(raw)
+    order = array("I", sorted(range(len(strings)), key=strings.__getitem__))
+    return offsets, b"".join(chunks), order
+
+
+def encode(entries, key, meta):
+    # The snapshot file contents for entries
+    offsets = array("Q", [0])
+    chunks = []
+    position = 0
+    for entry in entries:
+        raw = json.dumps(entry, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        position += len(raw)
+        offsets.append(position)
+        chunks.append(raw)
+    key_offsets, key_heap, by_key = _heap([entry.get(key, "").lower() for entry in entries])
+    id_offsets, id_heap, by_id = _heap([entry.get("id", "") for entry in entries])
+
+    meta = dict(meta, count=len(entries), key=key, heap_size=position,
+                key_heap_size=len(key_heap), id_heap_size=len(id_heap))
+    meta_raw = json.dumps(meta).encode("utf-8")
+    header = HEADER.pack(MAGIC, FORMAT, len(meta_raw)) + meta_raw
+    header += b"\0" * (_align(len(header)) - len(header))
+    sections = b"".join(part.tobytes() for part in (offsets, key_offsets, id_offsets, by_key, by_id))
+    sections += b"\0" * (_align(len(sections)) - len(sections))
+    return header + sections + b"".join(chunks) + key_heap + id_heap
+
+
+@metrics.timed("snapshot.compile")
+def compile_snapshot(name):
+    # Writes datasets/<name>.snap from the JSON dataset (journal included).
+    # Reads a private copy of the dataset, so compiling doesn't leave the
+    # parsed entries resident in the process.
+    dataset = dataset_store.open_json_dataset(name)
+    entries = dataset.load()
+    meta = {"name": name, "stamp": _jsonable(dataset.stamp)}
+    if isinstance(dataset, dataset_store.JournaledDataset):
+        # Journal lines from journal_offset on aren't in the snapshot yet;
+        # None means all of them, once a journal for this base is started
+        meta["base"] = dataset.base
+        meta["journal_offset"] = dataset.journal_offset if dataset.journal_base == dataset.base else None
+    raw = encode(entries, SNAPSHOT_DATASETS[name], meta)
+    path = snapshot_path(name)
+    # Per-process temp name: several workers may recompile at once
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(raw)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return path
+
+
+class Snapshot:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, fmt, meta_length = HEADER.unpack_from(self.map)
+        if magic != MAGIC or fmt != FORMAT:
+            raise ValueError(f"{path} is not a format {FORMAT} snapshot")
+        self.meta = json.loads(self.map[HEADER.size:HEADER.size + meta_length])
+        self.stamp = self.meta["stamp"]
+        n = self.size = self.meta["count"]
+
+        view = memoryview(self.map)
+        start = _align(HEADER.size + meta_length)
+        self.offsets = view[start:start + 8 * (n + 1)].cast("Q")
+        start += 8 * (n + 1)
+        self.key_offsets = view[start:start + 8 * (n + 1)].cast("Q")
+        start += 8 * (n + 1)
+        self.id_offsets = view[start:start + 8 * (n + 1)].cast("Q")
+        start += 8 * (n + 1)
+        self.by_key = view[start:start + 4 * n].cast("I")
+        start += 4 * n
+        self.by_id = view[start:start + 4 * n].cast("I")
+        self.heap = _align(start + 4 * n)
+        self.key_heap = self.heap + self.meta["heap_size"]
+        self.end = self.key_heap + self.meta["key_heap_size"]
+        self.id_heap = self.end
+        self.order = range(n)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.size:
+            raise IndexError(i)
+        return json.loads(self.map[self.heap + self.offsets[i]:self.heap + self.offsets[i + 1]])
+
+    def __iter__(self):
+        for i in range(self.size):
+            yield self[i]
+
+    def key(self, i):
+        # Lowercased key of entry i
+        start = self.key_heap + self.key_offsets[i]
+        return self.map[start:self.key_heap + self.key_offsets[i + 1]].decode("utf-8")
+
+    def id(self, i):
+        start = self.id_heap + self.id_offsets[i]
+        return self.map[start:self.id_heap + self.id_offsets[i + 1]].decode("utf-8")
+
+    def position(self, entry_id):
+        # Position of the entry with this id, or None
+        i = bisect.bisect_left(self.by_id, entry_id, key=self.id)
+        if i < self.size and self.id(self.by_id[i]) == entry_id:
+            return self.by_id[i]
+        return None
+
+    def find(self, key):
+        return _find(self, key)
+
+    def matching(self, query):
+        # Positions, ascending, of the entries whose key contains query
+        # (lowercase); a byte search over the key heap
+        needle = query.encode("utf-8")
+        matches = []
+        if not needle:
+            return list(range(self.size))
+        found = self.map.find(needle, self.key_heap, self.end)
+        while found != -1:
+            offset = found - self.key_heap
+            i = bisect.bisect_right(self.key_offsets, offset) - 1
+            if offset + len(needle) <= self.key_offsets[i + 1]:
+                matches.append(i)
+                # One hit per entry: go on from the next key
+                found = self.map.find(needle, self.key_heap + self.key_offsets[i + 1], self.end)
+            else:
+                # Straddles two keys
+                found = self.map.find(needle, found + 1, self.end)
+        return matches
+
+
+def _find(source, key):
+    # First entry whose key matches case-insensitively, or None
+    key = key.lower()
+    i = bisect.bisect_left(source.by_key, key, key=source.key)
+    if i < len(source.by_key) and source.key(source.by_key[i]) == key:
+        return source[source.by_key[i]]
+    return None
+
+
+class Overlay:
+    # A Snapshot with journal edits made after it was compiled laid over it,
+    # behind the same reading interface. Positions 0..n-1 are the snapshot's
+    # entries, added entries follow; deleted positions are left out of order
+    # and by_key. Overlays are never changed once handed out: advance()
+    # returns a new one.
+    def __init__(self, base, stamp):
+        self.base = base
+        self.stamp = stamp
+        self.key_field = base.meta["key"]
+        self.journal_offset = base.meta.get("journal_offset")
+        # None: the journal's header hasn't been read yet
+        self.journal_base = base.meta.get("base") if self.journal_offset is not None else None
+        self.changed = {}
+        self.deleted = set()
+        self.ids = {}
+        self.size = base.size
+
+    def advance(self, records, offset, stamp):
+        # A new Overlay with these journal records (read up to offset) applied,
+        # or None if the journal was started over for another snapshot
+        base = self.base.meta.get("base")
+        if any(record.get("base", base) != base for record in records) and self.journal_base == base:
+            return None
+        overlay = Overlay.__new__(Overlay)
+        overlay.__dict__.update(self.__dict__)
+        overlay.changed = dict(self.changed)
+        overlay.deleted = set(self.deleted)
+        overlay.ids = dict(self.ids)
+        overlay.__dict__.pop("_by_key", None)
+        overlay.__dict__.pop("_order", None)
+        for record in records:
+            if "base" in record:
+                overlay.journal_base = record["base"]
+            elif overlay.journal_base == base:
+                overlay._apply(record)
+        # A journal left over from an older snapshot is ignored, like
+        # JournaledDataset does, and read again from the top next time
+        if overlay.journal_base == base:
+            overlay.journal_offset = offset
+        overlay.stamp = stamp
+        return overlay
+
+    def _position(self, entry_id):
+        if entry_id in self.ids:
+            return self.ids[entry_id]
+        i = self.base.position(entry_id)
+        return None if i in self.deleted else i
+
+    def _apply(self, op):
+        # Mirrors IndexedDataset._apply
+        if op["op"] == "add":
+            self.changed[self.size] = op["entry"]
+            self.ids[op["entry"]["id"]] = self.size
+            self.size += 1
+            return
+        i = self._position(op["id"])
+        if i is None:
+            return
+        if op["op"] == "update":
+            self.changed[i] = op["entry"]
+        elif op["op"] == "delete":
+            self.changed.pop(i, None)
+            self.ids.pop(op["id"], None)
+            self.deleted.add(i)
+
+    def __len__(self):
+        return self.size - len(self.deleted)
+
+    def __getitem__(self, i):
+        entry = self.changed.get(i)
+        if entry is not None:
+            return entry
+        if i in self.deleted or not 0 <= i < self.base.size:
+            raise IndexError(i)
+        return self.base[i]
+
+    def __iter__(self):
+        for i in self.order:
+            yield self[i]
+
+    def key(self, i):
+        entry = self.changed.get(i)
+        if entry is not None:
+            return entry.get(self.key_field, "").lower()
+        return self.base.key(i)
+
+    @property
+    def order(self):
+        # Live positions in the order they were added
+        if not self.deleted:
+            return range(self.size)
+        if "_order" not in self.__dict__:
+            self._order = array("I", (i for i in range(self.size) if i not in self.deleted))
+        return self._order
+
+    @property
+    def by_key(self):
+        if not self.changed and not self.deleted:
+            return self.base.by_key
+        if "_by_key" not in self.__dict__:
+            touched = self.deleted.union(i for i in self.changed if i < self.base.size)
+            if touched:
+                by_key = array("I", (i for i in self.base.by_key if i not in touched))
+            else:
+                by_key = array("I", self.base.by_key)
+            for i in sorted(self.changed):
+                bisect.insort(by_key, i, key=self.key)
+            self._by_key = by_key
+        return self._by_key
+
+    def find(self, key):
+        return _find(self, key)
+
+    def matching(self, query):
+        # Positions, ascending, of the entries whose key contains query
+        matches = self.base.matching(query)
+        if not self.changed and not self.deleted:
+            return matches
+        matches = [i for i in matches if i not in self.changed and i not in self.deleted]
+        matches += (i for i in self.changed if query in self.key(i))
+        return sorted(matches)
+
+
+class EntryList:
+    # The Overlay reading interface over a list of entry dicts
+    def __init__(self, entries, key="word", stamp=None):
+        self.entries = entries
+        self.stamp = stamp
+        self.lowers = [entry.get(key, "").lower() for entry in entries]
+        self.by_key = sorted(range(len(entries)), key=self.lowers.__getitem__)
+        self.order = range(len(entries))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, i):
+        return self.entries[i]
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def key(self, i):
+        return self.lowers[i]
+
+    def find(self, key):
+        return _find(self, key)
+
+    def matching(self, query):
+        return [i for i, lower in enumerate(self.lowers) if query in lower]
+
+
+def is_fresh(name):
+    path = snapshot_path(name)
+    if not os.path.exists(path):
+        return False
+    try:
+        return Snapshot(path).stamp == _jsonable(dataset_store.json_stamp(name))
+    except (ValueError, KeyError, struct.error):
+        return False
+
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+_compiling = set()
+# name -> dataset backing the EntryList served while a new snapshot compiles
+_loaded = {}
+
+
+def _file_stamp(name, stamp):
+    # The part of a json_stamp that belongs to the JSON file itself
+    return stamp[0] if name in dataset_store.JOURNALED_DATASETS else stamp
+
+
+def _overlay(name, overlay, stamp):
+    # overlay brought up to date with the journal, or None if the journal
+    # doesn't continue from it (it was rewritten or cut short)
+    if name not in dataset_store.JOURNALED_DATASETS:
+        return overlay
+    offset = overlay.journal_offset or 0
+    if stamp[1] is not None and stamp[1][1] < offset:
+        return None
+    try:
+        records, end = dataset_store.read_journal(dataset_store.journal_path(name), offset)
+    except FileNotFoundError:
+        records, end = [], offset
+    return overlay.advance(records, end, stamp)
+
+
+def _open(name, stamp):
+    # An Overlay of the compiled snapshot if it was compiled from the current
+    # JSON file, else None
+    try:
+        base = Snapshot(snapshot_path(name))
+    except (OSError, ValueError, KeyError, struct.error):
+        return None
+    if _file_stamp(name, base.stamp) != _file_stamp(name, stamp):
+        return None
+    return _overlay(name, Overlay(base, stamp), stamp)
+
+
+def _load(name):
+    # An EntryList of the dataset as it is now, for the recompile window. The
+    # shared dataset is used when it reads the same JSON files (usually
+    # already loaded); otherwise a private copy is kept, so later calls only
+    # replay new journal lines into it.
+    dataset = _loaded.get(name)
+    if dataset is None:
+        dataset = dataset_store.get_dataset(name)
+        if type(dataset) is not type(dataset_store.open_json_dataset(name)):
+            dataset = dataset_store.open_json_dataset(name)
+        _loaded[name] = dataset
+    with dataset.lock:
+        # Copied: appends grow the dataset's list in place
+        entries = list(dataset.load())
+        stamp = _jsonable(dataset.stamp)
+    return EntryList(entries, SNAPSHOT_DATASETS[name], stamp)
+
+
+def _compile_in_background(name):
+    try:
+        compile_snapshot(name)
+    finally:
+        with _snapshots_lock:
+            _compiling.discard(name)
+
+
+def _settled(name, view):
+    # False for the stopgap EntryList once its snapshot has been compiled
+    return isinstance(view, Overlay) or name in _compiling
+
+
+def get_snapshot(name):
+    # The dataset's current entries: the last compiled snapshot with newer
+    # journal lines overlaid (see the top of this file)
+    stamp = _jsonable(dataset_store.json_stamp(name))
+    cached = _snapshots.get(name)
+    if cached is not None and cached.stamp == stamp and _settled(name, cached):
+        metrics.cache("snapshot", True)
+        return cached
+    with _snapshots_lock:
+        cached = _snapshots.get(name)
+        if cached is not None and cached.stamp == stamp and _settled(name, cached):
+            return cached
+        metrics.cache("snapshot", False)
+        view = None
+        if isinstance(cached, Overlay):
+            if _file_stamp(name, cached.base.stamp) == _file_stamp(name, stamp):
+                view = _overlay(name, cached, stamp)
+        if view is None:
+            view = _open(name, stamp)
+        if view is None and cached is not None:
+            # The JSON file changed: compile off the request path and serve
+            # the dataset itself until the new snapshot is in
+            if name not in _compiling:
+                _compiling.add(name)
+                threading.Thread(target=_compile_in_background, args=(name,), daemon=True).start()
+            view = _load(name)
+        elif view is None:
+            compile_snapshot(name)
+            view = _open(name, stamp) or Overlay(Snapshot(snapshot_path(name)), stamp)
+        if isinstance(view, Overlay):
+            _loaded.pop(name, None)
+        # Mappings handed out earlier stay valid: replacing the file leaves
+        # their inode in place until they're collected
+        _snapshots[name] = view
+        return view
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile the JSON datasets into memory-mapped snapshots")
+    parser.add_argument("datasets", nargs="*", help=f"any of {', '.join(sorted(SNAPSHOT_DATASETS))} (default: all)")
+    parser.add_argument("--force", action="store_true", help="recompile even if up to date")
+    args = parser.parse_args(argv)
+    unknown = set(args.datasets) - set(SNAPSHOT_DATASETS)
+    if unknown:
+        parser.error(f"no snapshot for {', '.join(sorted(unknown))}")
+
+    for name in args.datasets or sorted(SNAPSHOT_DATASETS):
+        if not args.force and is_fresh(name):
+            print(f"{name}: up to date")
+            continue
+        path = compile_snapshot(name)
+        print(f"{name}: {len(Snapshot(path))} entries, {os.path.getsize(path) / 1024:.1f} KB -> {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
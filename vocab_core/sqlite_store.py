@@ -0,0 +1,373 @@
+import argparse
+import functools
+import os
+import re
+import sqlite3
+import threading
+import uuid
+
+from . import dataset_store, metrics
+
+# Optional SQLite backend for the vocab, one-word and idiom datasets.
+#
+# Select it at startup with VOCAB_STORAGE=sqlite (and optionally
+# VOCAB_SQLITE_PATH), after filling the database once from the JSON files:
+#
+#     python -m vocab_core.sqlite_store migrate
+#
+# Each dataset is a table with a case-insensitive index on its key column,
+# list fields (synonyms/antonyms) live in child tables and an FTS5 table
+# indexes the searchable text. Every edit is a single-row transaction and
+# update/delete use the same compare-and-swap on "version" as the JSON
+# journal, and a rename onto another entry's key gives the same DUPLICATE
+# result. load() still serves a shared in-memory list for the quiz pages; it
+# is rebuilt only when the table's generation counter moves.
+
+SQLITE_PATH = os.environ.get(
+    "VOCAB_SQLITE_PATH", os.path.join(dataset_store.DATASETS_DIR, "english.db")
+)
+
+TABLES = {
+    "vocab": {
+        "key": "word",
+        "fields": ["word", "meaning"],
+        "lists": ["synonyms", "antonyms"],
+        "fts": ["word", "meaning", "synonyms"],
+        "unique": True,
+    },
+    "onewords": {
+        "key": "word",
+        "fields": ["word", "meaning"],
+        "lists": [],
+        "fts": ["word", "meaning"],
+        "unique": False,
+    },
+    # idioms.json has a few repeated idioms, so no unique key here
+    "idioms": {
+        "key": "idiom",
+        "fields": ["idiom", "meaning"],
+        "lists": [],
+        "fts": ["idiom", "meaning"],
+        "unique": False,
+    },
+}
+
+
+def connect(path=None):
+    conn = sqlite3.connect(path or SQLITE_PATH, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+
+def create_schema(conn):
+    with conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, generation INTEGER NOT NULL)")
+        for name, spec in TABLES.items():
+            columns = ", ".join(f"{field} TEXT NOT NULL" for field in spec["fields"])
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {name} ("
+                f"seq INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, version INTEGER NOT NULL, {columns})"
+            )
+            unique = "UNIQUE " if spec["unique"] else ""
+            conn.execute(
+                f"CREATE {unique}INDEX IF NOT EXISTS {name}_key ON {name} ({spec['key']} COLLATE NOCASE)"
+            )
+            for field in spec["lists"]:
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {name}_{field} ("
+                    f"seq INTEGER NOT NULL REFERENCES {name}(seq) ON DELETE CASCADE, "
+                    f"position INTEGER NOT NULL, value TEXT NOT NULL, PRIMARY KEY (seq, position))"
+                )
+                conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS {name}_{field}_value ON {name}_{field} (value COLLATE NOCASE)"
+                )
+            conn.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {name}_fts USING fts5({', '.join(spec['fts'])})"
+            )
+            conn.execute("INSERT OR IGNORE INTO meta (name, generation) VALUES (?, 0)", (name,))
+
+
+def _match_expression(query):
+    # Quote every term so user input can't inject FTS syntax; prefix-match
+    # the terms so search works while the user is still typing
+    terms = re.findall(r"\w+", query)
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+class SqliteDataset(dataset_store.IndexedDataset):
+    def __init__(self, name, path=None):
+        spec = TABLES[name]
+        super().__init__(path or SQLITE_PATH, key=spec["key"])
+        self.name = name
+        self.spec = spec
+        self.local = threading.local()
+        self.writer = connect(self.path)
+        create_schema(self.writer)
+
+    def _reader(self):
+        # One connection per thread; in WAL mode readers never wait on writers
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = connect(self.path)
+            self.local.conn = conn
+        return conn
+
+    def _current_stamp(self):
+        row = self._reader().execute(
+            "SELECT generation FROM meta WHERE name = ?", (self.name,)
+        ).fetchone()
+        return row[0]
+
+    def load(self):
+        stamp = self._current_stamp()
+        if self.data is not None and stamp == self.stamp:
+            metrics.cache("dataset.load", True)
+            return self.data
+        with self.lock:
+            if self.data is None or self._current_stamp() != self.stamp:
+                metrics.cache("dataset.load", False)
+                self._reload()
+                self.version += 1
+            return self.data
+
+    @metrics.timed("dataset.reload")
+    def _reload(self):
+        conn = self._reader()
+        name, fields = self.name, self.spec["fields"]
+        conn.execute("BEGIN")
+        try:
+            # Read the generation in the same transaction as the rows
+            self.stamp = conn.execute(
+                "SELECT generation FROM meta WHERE name = ?", (name,)
+            ).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT seq, id, version, {', '.join(fields)} FROM {name} ORDER BY seq"
+            ).fetchall()
+            lists = {}
+            for field in self.spec["lists"]:
+                values = lists[field] = {}
+                for seq, value in conn.execute(
+                    f"SELECT seq, value FROM {name}_{field} ORDER BY seq, position"
+                ):
+                    values.setdefault(seq, []).append(value)
+        finally:
+            conn.commit()
+        self.data = []
+        for row in rows:
+            entry = dict(zip(fields, row[3:]))
+            for field in self.spec["lists"]:
+                entry[field] = lists[field].get(row[0], [])
+            entry["id"] = row[1]
+            entry["version"] = row[2]
+            self.data.append(entry)
+        self._index()
+
+    def _entry(self, entry, entry_id, version):
+        result = {field: entry[field] for field in self.spec["fields"]}
+        for field in self.spec["lists"]:
+            result[field] = list(entry.get(field, []))
+        result["id"] = entry_id
+        result["version"] = version
+        return result
+
+    def _write_rows(self, seq, entry):
+        for field in self.spec["lists"]:
+            self.writer.executemany(
+                f"INSERT INTO {self.name}_{field} (seq, position, value) VALUES (?, ?, ?)",
+                [(seq, i, value) for i, value in enumerate(entry[field])],
+            )
+        values = [
+            " ".join(entry[field]) if field in self.spec["lists"] else entry[field]
+            for field in self.spec["fts"]
+        ]
+        placeholders = ", ".join("?" * len(values))
+        self.writer.execute(
+            f"INSERT INTO {self.name}_fts (rowid, {', '.join(self.spec['fts'])}) VALUES (?, {placeholders})",
+            [seq] + values,
+        )
+
+    def _delete_rows(self, seq):
+        for field in self.spec["lists"]:
+            self.writer.execute(f"DELETE FROM {self.name}_{field} WHERE seq = ?", (seq,))
+        self.writer.execute(f"DELETE FROM {self.name}_fts WHERE rowid = ?", (seq,))
+
+    def _bump(self):
+        self.writer.execute("UPDATE meta SET generation = generation + 1 WHERE name = ?", (self.name,))
+        return self.writer.execute(
+            "SELECT generation FROM meta WHERE name = ?", (self.name,)
+        ).fetchone()[0]
+
+    def _applied(self, op, generation):
+        # Patch the in-memory copy if ours was the only write since the last
+        # load, otherwise let the next load() rebuild it from the database
+        if generation == self.stamp + 1:
+            self._apply(op)
+            self.stamp = generation
+            self.version += 1
+        else:
+            self.stamp = None
+
+    def _insert_row(self, entry):
+        # Inside a writer transaction; raises IntegrityError on a duplicate key
+        fields = self.spec["fields"]
+        cursor = self.writer.execute(
+            f"INSERT INTO {self.name} (id, version, {', '.join(fields)}) "
+            f"VALUES (?, ?, {', '.join('?' * len(fields))})",
+            [entry["id"], entry["version"]] + [entry[field] for field in fields],
+        )
+        self._write_rows(cursor.lastrowid, entry)
+
+    def _update_row(self, entry_id, expected_version, entry):
+        # Inside a writer transaction; False if the version moved on
+        fields = self.spec["fields"]
+        rows = self.writer.execute(
+            f"UPDATE {self.name} SET version = version + 1, "
+            f"{', '.join(f'{field} = ?' for field in fields)} "
+            f"WHERE id = ? AND version = ? RETURNING seq",
+            [entry[field] for field in fields] + [entry_id, expected_version],
+        ).fetchall()
+        if not rows:
+            return False
+        self._delete_rows(rows[0][0])
+        self._write_rows(rows[0][0], entry)
+        return True
+
+    def insert(self, entry):
+        with self.lock:
+            self.load()
+            entry = self._entry(entry, uuid.uuid4().hex, 1)
+            try:
+                with self.writer:
+                    self._insert_row(entry)
+                    generation = self._bump()
+            except sqlite3.IntegrityError:
+                return None
+            self._applied({"op": "add", "entry": entry}, generation)
+            return entry
+
+    def update(self, entry_id, expected_version, entry):
+        with self.lock:
+            self.load()
+            entry = self._entry(entry, entry_id, expected_version + 1)
+            try:
+                with self.writer:
+                    if not self._update_row(entry_id, expected_version, entry):
+                        return None
+                    generation = self._bump()
+            except sqlite3.IntegrityError:
+                # The unique key index: renamed to another entry's key
+                return dataset_store.DUPLICATE
+            self._applied({"op": "update", "id": entry_id, "entry": entry}, generation)
+            return entry
+
+    @metrics.timed("dataset.batch")
+    def apply_batch(self, ops):
+        # Same ops as IndexedDataset._batch, committed in one transaction
+        with self.lock:
+            self.load()
+            results = []
+            with self.writer:
+                # Explicit, so the savepoints below nest inside one transaction
+                self.writer.execute("BEGIN IMMEDIATE")
+                for op in ops:
+                    if op["op"] == "add":
+                        entry = self._entry(op["entry"], uuid.uuid4().hex, 1)
+                        write = self._insert_row
+                    else:
+                        entry = self._entry(op["entry"], op["id"], op["version"] + 1)
+                        write = functools.partial(self._update_row, op["id"], op["version"])
+                    try:
+                        # Savepoint so a duplicate key only undoes its own rows
+                        self.writer.execute("SAVEPOINT batch_row")
+                        if write(entry) is False:
+                            entry = None
+                        self.writer.execute("RELEASE batch_row")
+                    except sqlite3.IntegrityError:
+                        self.writer.execute("ROLLBACK TO batch_row")
+                        self.writer.execute("RELEASE batch_row")
+                        entry = None
+                    results.append(entry)
+                self._bump()
+            # Reload on next access rather than patching entry by entry
+            self.stamp = None
+            return results
+
+    def delete(self, entry_id, expected_version):
+        with self.lock:
+            self.load()
+            with self.writer:
+                rows = self.writer.execute(
+                    f"DELETE FROM {self.name} WHERE id = ? AND version = ? RETURNING seq",
+                    (entry_id, expected_version),
+                ).fetchall()
+                if not rows:
+                    return False
+                row = rows[0]
+                self._delete_rows(row[0])
+                generation = self._bump()
+            self._applied({"op": "delete", "id": entry_id}, generation)
+            return True
+
+    def search(self, query, limit=50):
+        match = _match_expression(query)
+        if not match:
+            return []
+        name = self.name
+        rows = self._reader().execute(
+            f"SELECT {name}.id FROM {name}_fts JOIN {name} ON {name}.seq = {name}_fts.rowid "
+            f"WHERE {name}_fts MATCH ? ORDER BY rank LIMIT ?",
+            (match, limit),
+        ).fetchall()
+        results = (self.get(row[0]) for row in rows)
+        return [entry for entry in results if entry is not None]
+
+    @metrics.timed("dataset.save")
+    def save(self, data):
+        # Replace the whole table in one transaction
+        with self.lock:
+            entries = [
+                self._entry(entry, entry.get("id") or uuid.uuid4().hex, entry.get("version", 1))
+                for entry in data
+            ]
+            fields = self.spec["fields"]
+            with self.writer:
+                self.writer.execute(f"DELETE FROM {self.name}")
+                self.writer.execute(f"DELETE FROM {self.name}_fts")
+                for entry in entries:
+                    cursor = self.writer.execute(
+                        f"INSERT INTO {self.name} (id, version, {', '.join(fields)}) "
+                        f"VALUES (?, ?, {', '.join('?' * len(fields))})",
+                        [entry["id"], entry["version"]] + [entry[field] for field in fields],
+                    )
+                    self._write_rows(cursor.lastrowid, entry)
+                self._bump()
+            self.stamp = None
+
+    def compact(self):
+        with self.lock:
+            self.writer.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def migrate(path=None, force=False):
+    # One-shot copy of the JSON datasets (journal included) into SQLite
+    conn = connect(path)
+    create_schema(conn)
+    for name in TABLES:
+        count = conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+        if count and not force:
+            print(f"{name}: already has {count} rows, skipping (use --force to replace)")
+            continue
+        data = dataset_store.open_json_dataset(name).load()
+        SqliteDataset(name, path).save(data)
+        print(f"{name}: migrated {len(data)} entries")
+    conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SQLite storage for the English Mastery datasets")
+    parser.add_argument("command", choices=["migrate"])
+    parser.add_argument("--db", default=None, help=f"database file (default: {SQLITE_PATH})")
+    parser.add_argument("--force", action="store_true", help="replace tables that already have rows")
+    args = parser.parse_args()
+    migrate(args.db, args.force)
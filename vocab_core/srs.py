@@ -0,0 +1,254 @@
+import atexit
+import heapq
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from . import dataset_store, metrics
+
+# Spaced repetition (SM-2) for the quiz pages.
+#
+# Every (user, deck, item) gets a card with an ease factor, an interval in
+# days, a repetition count and a due time. Cards of one user and deck sit in a
+# min-heap keyed by due time, so choosing the next card is a heap pop, not a
+# scan. Rescheduling pushes a fresh heap entry and leaves the old one behind;
+# stale entries are recognised (their due time no longer matches the card)
+# and skipped when they reach the top.
+#
+# Only answers given once a card is due move SM-2 on. A card answered
+# before its due time (practice when nothing was due) keeps its schedule if
+# the answer is right, so drilling can't inflate the intervals; a wrong
+# answer still sends it back to relearning.
+#
+# Review state is persisted as an append-only JSON-lines log of card
+# snapshots, replayed on first use (the last snapshot of a card wins) and
+# compacted once it holds mostly superseded lines. Answers only queue their
+# snapshot in memory; a background thread appends the queue in batches, as
+# answer_log does, and both the appends and compaction's read and rewrite
+# hold the log's file lock so other processes' lines are never dropped.
+
+REVIEWS_PATH = os.path.join("progress", "reviews.jsonl")
+
+DAY = 24 * 60 * 60
+# A wrong answer brings the card back within the same session
+RELEARN_DELAY = 10 * 60
+# A card handed out but not answered yet comes back after this long
+LEASE = 10 * 60
+# Draws from pick() before settling for an item scheduled for later
+PICK_TRIES = 8
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+
+# Flush at least this often, or sooner once this many snapshots are waiting
+FLUSH_INTERVAL = 2.0
+FLUSH_BATCH = 200
+
+# Grades fed into SM-2; the quizzes only know right or wrong
+CORRECT_QUALITY = 4
+WRONG_QUALITY = 1
+
+
+def schedule(card, quality, now):
+    # SM-2 update of card in place
+    if quality < 3:
+        card["reps"] = 0
+        card["interval"] = 0
+        card["due"] = now + RELEARN_DELAY
+    else:
+        card["reps"] += 1
+        if card["reps"] == 1:
+            card["interval"] = 1
+        elif card["reps"] == 2:
+            card["interval"] = 6
+        else:
+            card["interval"] = round(card["interval"] * card["ease"], 2)
+        card["due"] = now + card["interval"] * DAY
+    card["ease"] = max(
+        MIN_EASE, card["ease"] + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)
+    )
+
+
+class Deck:
+    def __init__(self):
+        self.cards = {}
+        self.heap = []
+
+    def put(self, item, card):
+        self.cards[item] = card
+        heapq.heappush(self.heap, (card["due"], item))
+
+    def pop_due(self, now):
+        # Item of the earliest due card if it is due by now, else None
+        heap = self.heap
+        while heap:
+            due, item = heap[0]
+            card = self.cards.get(item)
+            if card is None or card["due"] != due:
+                heapq.heappop(heap)
+                continue
+            if due > now:
+                return None
+            heapq.heappop(heap)
+            return item
+        return None
+
+
+class ReviewStore:
+    def __init__(self, path=REVIEWS_PATH):
+        self.path = path
+        self.decks = None
+        self.lock = threading.Lock()
+        self.lines = 0
+        self.card_count = 0
+        self.buffer = deque()
+        # Held while a batch is written and while the log is compacted
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.thread_lock = threading.Lock()
+
+    def _load(self):
+        if self.decks is not None:
+            return
+        self.decks = {}
+        cards = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.lines += 1
+                    cards[(record["user"], record["deck"], record["item"])] = record
+        except FileNotFoundError:
+            pass
+        for (user, deck, item), record in cards.items():
+            card = {key: record[key] for key in ("ease", "interval", "reps", "due")}
+            self._deck(user, deck).put(item, card)
+        self.card_count = len(cards)
+
+    def _deck(self, user, deck):
+        key = (user, deck)
+        if key not in self.decks:
+            self.decks[key] = Deck()
+        return self.decks[key]
+
+    def next_item(self, user, deck, pick, now=None):
+        # A due card, earliest first; with nothing due, whatever pick()
+        # chooses for practice (it favours unseen and weak items), passing
+        # over items that already have a card scheduled for later
+        now = time.time() if now is None else now
+        with self.lock:
+            self._load()
+            cards = self._deck(user, deck)
+            item = cards.pop_due(now)
+            if item is None:
+                for _ in range(PICK_TRIES):
+                    item = pick()
+                    if item not in cards.cards:
+                        break
+                return item
+            # Lease it so a question that is never answered comes back; the
+            # due time it had is kept for record_answer
+            card = cards.cards[item]
+            card = dict(card, due=now + LEASE, scheduled=card.get("scheduled", card["due"]))
+            cards.put(item, card)
+            return item
+
+    def record_answer(self, user, deck, item, correct, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            self._load()
+            cards = self._deck(user, deck)
+            card = cards.cards.get(item)
+            if card is None:
+                self.card_count += 1
+                card = {"ease": DEFAULT_EASE, "interval": 0, "reps": 0, "due": now}
+            card = dict(card)
+            scheduled = card.pop("scheduled", card["due"])
+            if correct and now < scheduled:
+                # Early review, the schedule stays as it is
+                return card
+            schedule(card, CORRECT_QUALITY if correct else WRONG_QUALITY, now)
+            cards.put(item, card)
+            self._append(dict(card, user=user, deck=deck, item=item))
+            return card
+
+    def _append(self, record):
+        # Called on the request path: no I/O here
+        self.buffer.append(record)
+        if len(self.buffer) >= FLUSH_BATCH:
+            self.wakeup.set()
+        self._start()
+
+    def _start(self):
+        if self.thread is not None:
+            return
+        with self.thread_lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="srs-log", daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        while True:
+            self.wakeup.wait(FLUSH_INTERVAL)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except OSError:
+                # Keep the snapshots buffered and try again next round
+                pass
+
+    @metrics.timed("reviews.flush")
+    def flush(self):
+        with self.flush_lock:
+            batch = list(self.buffer)
+            if not batch:
+                return
+            raw = "".join(json.dumps(record) + "\n" for record in batch).encode("utf-8")
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with dataset_store.file_lock(self.path), open(self.path, "ab") as f:
+                f.write(raw)
+            # Only now: on OSError the batch stays buffered
+            for _ in batch:
+                self.buffer.popleft()
+            with self.lock:
+                self.lines += len(batch)
+                compact = self.lines > 2 * self.card_count + 1000
+            if compact:
+                self._compact()
+
+    def _compact(self):
+        # Rewrite the log with one line per card. Leased due times are only
+        # kept in memory, so write the card's last persisted state instead.
+        # The file lock is held from the read to the rename, so lines other
+        # processes append meanwhile wait for the new file instead of being
+        # lost with the old one.
+        records = {}
+        with dataset_store.file_lock(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    records[(record["user"], record["deck"], record["item"])] = line
+            raw = "".join(records.values()).encode("utf-8")
+            dataset_store.write_atomic(self.path, raw)
+        with self.lock:
+            self.lines = len(records)
+
+
+_store = ReviewStore()
+atexit.register(_store.flush)
+
+
+def next_item(user, deck, pick, now=None):
+    return _store.next_item(user, deck, pick, now)
+
+
+def record_answer(user, deck, item, correct, now=None):
+    return _store.record_answer(user, deck, item, correct, now)
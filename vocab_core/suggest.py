@@ -0,0 +1,152 @@
+import bisect
+import heapq
+import threading
+
+from . import dataset_store, metrics
+
+# Search-as-you-type suggestions for a dataset's headwords.
+#
+# Prefix matches come from per-length sorted lists of lowercased words: one
+# bisect per length yields the matches already ordered shortest-first, so a
+# query touches only as many words as it returns. Infix matches (query of 3+
+# characters) come from a trigram inverted index by intersecting the posting
+# sets of the query's trigrams, smallest first.
+#
+# The index subscribes to its dataset and applies add/update/delete edits in
+# place; when the dataset is reloaded wholesale it is marked stale and rebuilt
+# on the next query. Each query first has the dataset load() (a stat when
+# nothing changed), so edits other processes journaled arrive the same way.
+# Writers run under the dataset lock and readers take no lock: bisect, slicing
+# and set intersection are single C calls, so a reader at worst sees a
+# concurrent edit early or late.
+
+MAX_SUGGESTIONS = 10
+
+
+def _trigrams(key):
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+
+class SuggestionIndex:
+    def __init__(self, dataset, key="word"):
+        self.dataset = dataset
+        self.key = key
+        self.stale = True
+        self.words = {}
+        self.by_length = {}
+        self.lengths = []
+        self.trigrams = {}
+        dataset.subscribe(self._on_change)
+
+    def _on_change(self, kind, old, new):
+        if kind == "reset":
+            self.stale = True
+            return
+        if self.stale:
+            return
+        if old is not None:
+            self._remove(old[self.key])
+        if new is not None:
+            self._add(new[self.key])
+
+    def _rebuild(self):
+        # Under the dataset lock so no edit slips in between load and build
+        with self.dataset.lock:
+            if not self.stale:
+                return
+            self.words = {}
+            self.by_length = {}
+            self.lengths = []
+            self.trigrams = {}
+            for entry in self.dataset.load():
+                self._add(entry[self.key])
+            self.stale = False
+
+    def _add(self, word):
+        key = word.lower()
+        if key in self.words:
+            self.words[key] = word
+            return
+        self.words[key] = word
+        bucket = self.by_length.get(len(key))
+        if bucket is None:
+            bucket = self.by_length[len(key)] = []
+            self.lengths = sorted(self.by_length)
+        bisect.insort(bucket, key)
+        for gram in _trigrams(key):
+            self.trigrams.setdefault(gram, set()).add(key)
+
+    def _remove(self, word):
+        key = word.lower()
+        if self.words.pop(key, None) is None:
+            return
+        bucket = self.by_length[len(key)]
+        i = bisect.bisect_left(bucket, key)
+        if i < len(bucket) and bucket[i] == key:
+            del bucket[i]
+        for gram in _trigrams(key):
+            posting = self.trigrams.get(gram)
+            if posting is not None:
+                posting.discard(key)
+
+    def _prefix_matches(self, query, limit):
+        matches = []
+        for length in self.lengths:
+            if length < len(query):
+                continue
+            bucket = self.by_length.get(length, [])
+            i = bisect.bisect_left(bucket, query)
+            for key in bucket[i:i + limit - len(matches)]:
+                if not key.startswith(query):
+                    break
+                matches.append(key)
+            if len(matches) >= limit:
+                break
+        return matches
+
+    def _infix_matches(self, query, limit, exclude):
+        postings = sorted(
+            (self.trigrams.get(gram, set()) for gram in _trigrams(query)), key=len
+        )
+        if not postings or not postings[0]:
+            return []
+        candidates = postings[0].intersection(*postings[1:])
+        matches = (
+            key for key in candidates
+            if query in key and key not in exclude and not key.startswith(query)
+        )
+        return heapq.nsmallest(limit, matches, key=lambda key: (len(key), key))
+
+    def suggest(self, query, limit=MAX_SUGGESTIONS):
+        # Prefix matches first, then infix matches, shorter words first
+        query = query.strip().lower()
+        if not query:
+            return []
+        self.dataset.load()
+        if self.stale:
+            self._rebuild()
+        matches = self._prefix_matches(query, limit)
+        if len(matches) < limit and len(query) >= 3:
+            matches += self._infix_matches(query, limit - len(matches), set(matches))
+        words = self.words
+        return [words.get(key, key) for key in matches]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(name="vocab", key="word"):
+    index = _indexes.get(name)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(name)
+            if index is None:
+                index = SuggestionIndex(dataset_store.get_dataset(name), key)
+                _indexes[name] = index
+    return index
+
+
+@metrics.timed("suggest")
+def suggest(name, query, limit=MAX_SUGGESTIONS):
+    return get_index(name).suggest(query, limit)
@@ -0,0 +1,61 @@
+from . import dataset_store
+from . import metrics
+from . import search_engine
+
+DATASET_PATH = dataset_store.dataset_path("vocab")
+DUPLICATE = dataset_store.DUPLICATE
+
+def load_dataset():
+    # Shared in-memory copy, don't mutate it in place
+    return dataset_store.load("vocab")
+
+def save_dataset(data):
+    dataset_store.save("vocab", data)
+
+def get_word(word_id):
+    return dataset_store.get_entry("vocab", word_id)
+
+def find_word(word):
+    # Case-insensitive, served from an index rather than a scan
+    return dataset_store.find("vocab", word)
+
+# Edits go to the storage backend one entry at a time (a journal line for
+# JSON, a single-row transaction for SQLite) instead of rewriting vocab.json.
+# Entries are addressed by their stable "id"; update_word/delete_word take the
+# "version" the caller last saw and return False if someone else changed or
+# deleted the word in the meantime. update_word returns DUPLICATE instead when
+# the new word belongs to another entry.
+def add_new_word(new_entry):
+    # Returns the stored entry, or None if the word already exists
+    return dataset_store.insert("vocab", new_entry)
+
+def add_word(word, meaning, synonyms, antonyms):
+    return add_new_word({
+        "word": word,
+        "meaning": meaning,
+        "synonyms": synonyms,
+        "antonyms": antonyms
+    }) is not None
+
+def update_word(word_id, version, word, meaning, synonyms, antonyms):
+    updated = dataset_store.update("vocab", word_id, version, {
+        "word": word,
+        "meaning": meaning,
+        "synonyms": synonyms,
+        "antonyms": antonyms
+    })
+    if updated == DUPLICATE:
+        return DUPLICATE
+    return updated is not None
+
+def delete_word(word_id, version):
+    return dataset_store.delete("vocab", word_id, version)
+
+@metrics.timed("search")
+def search_words(query, limit=search_engine.DEFAULT_LIMIT):
+    # Full-text index when the backend has one, falling back to the fuzzy
+    # engine (which also catches typos the index can't). Best matches first.
+    results = dataset_store.search("vocab", query, limit)
+    if results:
+        return results
+    return [entry for entry, score in search_engine.search("vocab", query, limit)]